@@ -0,0 +1,181 @@
+"""
+Módulo para el almacenamiento particionado en Parquet: las compras se
+guardan por plataforma y mes, ordenadas por fecha, de modo que los filtros
+del sidebar se aplican en la propia lectura (poda de particiones y de
+grupos de filas por sus estadísticas) y solo se lee el trozo que cumple
+
+Uso:
+    python almacen.py compras.json datos_particionados/
+
+Solo se escribe en un directorio nuevo, vacío o que ya sea un almacén.
+"""
+import argparse
+import json
+import os
+import shutil
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:  # pragma: no cover - pyarrow es opcional
+    pa = None
+    ds = None
+
+ARCHIVO_RESUMEN = '_resumen.json'
+
+# Columnas que forman la ruta de cada partición (plataforma=.../mes=...)
+COLUMNAS_PARTICION = ['plataforma', 'mes']
+
+# Filas por grupo: cada grupo guarda mínimo y máximo de fecha y categoría
+FILAS_POR_GRUPO = 64_000
+
+COLUMNA_INDICE = '__indice'
+
+def almacen_disponible():
+    """
+    Indica si se puede usar el almacenamiento particionado (requiere pyarrow)
+    """
+    return ds is not None
+
+def es_particionado(directorio):
+    """
+    Indica si `directorio` contiene un almacén escrito por escribir_particionado
+    """
+    return isinstance(directorio, str) and os.path.isfile(os.path.join(directorio, ARCHIVO_RESUMEN))
+
+def destino_reemplazable(directorio):
+    """
+    Indica si se puede escribir un almacén en `directorio`: no existe, está
+    vacío o ya es un almacén (nunca se borra un directorio con otros datos)
+    """
+    if not os.path.lexists(directorio) or es_particionado(directorio):
+        return True
+    return os.path.isdir(directorio) and not os.path.islink(directorio) and not os.listdir(directorio)
+
+def _esquema_particion():
+    """
+    Particionado estilo Hive con las columnas de partición como texto
+    """
+    return ds.partitioning(
+        pa.schema([(columna, pa.string()) for columna in COLUMNAS_PARTICION]), flavor='hive'
+    )
+
+def escribir_particionado(df, directorio, huella=None):
+    """
+    Escribe el DataFrame procesado particionado por plataforma y mes, y un
+    resumen con las opciones de filtro y el rango de fechas, para no tener
+    que recorrer los datos al abrir el almacén. Solo reemplaza un almacén
+    anterior o un directorio vacío: lanza FileExistsError si `directorio`
+    existe con otro contenido.
+    """
+    if not almacen_disponible():
+        raise RuntimeError("El almacenamiento particionado requiere pyarrow")
+    if not destino_reemplazable(directorio):
+        raise FileExistsError(f"{directorio} existe y no es un almacén particionado; no se sobrescribe")
+
+    # Dentro de cada partición, agrupadas por categoría y ordenadas por fecha:
+    # así los grupos de filas tienen rangos estrechos de ambas
+    datos = df.sort_values(['plataforma', 'mes', 'categoria', 'fecha'], kind='stable')
+    datos = datos.assign(**{
+        COLUMNA_INDICE: datos.index.to_numpy(),
+        **{columna: datos[columna].astype(str) for columna in COLUMNAS_PARTICION}
+    })
+    tabla = pa.Table.from_pandas(datos, preserve_index=False)
+
+    temporal = f"{directorio.rstrip(os.sep)}.tmp-{os.getpid()}"
+    shutil.rmtree(temporal, ignore_errors=True)
+    ds.write_dataset(
+        tabla, temporal, format='parquet', partitioning=_esquema_particion(),
+        max_rows_per_group=FILAS_POR_GRUPO, min_rows_per_group=min(FILAS_POR_GRUPO, len(tabla)),
+        existing_data_behavior='overwrite_or_ignore'
+    )
+
+    resumen = {
+        'huella': f"pq-{huella or df.attrs.get('huella') or 'sin-huella'}",
+        'filas': len(df),
+        'columnas': list(df.columns),
+        'fecha_min': str(df['fecha'].min()),
+        'fecha_max': str(df['fecha'].max()),
+        'plataformas': sorted(df['plataforma'].unique().tolist()),
+        'categorias': sorted(df['categoria'].unique().tolist())
+    }
+    with open(os.path.join(temporal, ARCHIVO_RESUMEN), 'w', encoding='utf-8') as f:
+        json.dump(resumen, f, indent=2, ensure_ascii=False)
+
+    # Se reemplaza el almacén anterior solo cuando el nuevo está completo
+    shutil.rmtree(directorio, ignore_errors=True)
+    os.replace(temporal, directorio)
+
+    return resumen
+
+def leer_resumen(directorio):
+    """
+    Resumen del almacén: huella, filas, columnas, rango de fechas y valores
+    de plataforma y categoría
+    """
+    with open(os.path.join(directorio, ARCHIVO_RESUMEN), encoding='utf-8') as f:
+        return json.load(f)
+
+def filtro_compras(plataforma='Todas', categoria='Todas', rango_fechas=()):
+    """
+    Expresión de pyarrow equivalente a los filtros del sidebar: la
+    plataforma y los meses podan particiones; la categoría y las fechas,
+    grupos de filas por sus estadísticas
+    """
+    condiciones = []
+    if plataforma != 'Todas':
+        condiciones.append(ds.field('plataforma') == plataforma)
+    if categoria != 'Todas':
+        condiciones.append(ds.field('categoria') == categoria)
+    if len(rango_fechas) == 2:
+        desde = pd.Timestamp(rango_fechas[0])
+        hasta = pd.Timestamp(rango_fechas[1]) + pd.Timedelta(days=1)
+        condiciones += [
+            ds.field('mes') >= desde.strftime('%Y-%m'),
+            ds.field('mes') <= (hasta - pd.Timedelta(days=1)).strftime('%Y-%m'),
+            ds.field('fecha') >= pa.scalar(desde.to_pydatetime(), pa.timestamp('ns')),
+            ds.field('fecha') < pa.scalar(hasta.to_pydatetime(), pa.timestamp('ns'))
+        ]
+
+    filtro = None
+    for condicion in condiciones:
+        filtro = condicion if filtro is None else filtro & condicion
+    return filtro
+
+def leer_particionado(directorio, plataforma='Todas', categoria='Todas', rango_fechas=()):
+    """
+    Lee del almacén solo las compras que cumplen los filtros, ordenadas por
+    fecha como en la carga completa y con su índice original
+    """
+    if not almacen_disponible():
+        raise RuntimeError("El almacenamiento particionado requiere pyarrow")
+
+    dataset = ds.dataset(directorio, format='parquet', partitioning=_esquema_particion())
+    tabla = dataset.to_table(filter=filtro_compras(plataforma, categoria, rango_fechas))
+
+    df = tabla.to_pandas()
+    df = df.sort_values(['fecha', COLUMNA_INDICE], kind='stable')
+    df = df.set_index(COLUMNA_INDICE)
+    df.index.name = None
+
+    return df
+
+def main():
+    parser = argparse.ArgumentParser(description="Convierte compras al almacén particionado en Parquet")
+    parser.add_argument('origen', help="Archivo, directorio o patrón glob de compras")
+    parser.add_argument('destino', help="Directorio del almacén particionado")
+    args = parser.parse_args()
+
+    from data_loader import cargar_datos
+
+    if not destino_reemplazable(args.destino):
+        parser.error(f"{args.destino} existe y no es un almacén particionado; no se sobrescribe")
+
+    df = cargar_datos(args.origen, usar_cache=False)
+    resumen = escribir_particionado(df, args.destino)
+    print(f"{resumen['filas']:,} compras en {args.destino} "
+          f"({len(resumen['plataformas'])} plataformas, {resumen['fecha_min'][:10]} a {resumen['fecha_max'][:10]})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,422 @@
+"""
+Módulo con el cálculo de métricas, tablas e insights, sin dependencias de
+Streamlit: devuelve objetos con los resultados que metrics.py e insights.py
+se limitan a mostrar, y que también pueden usarse desde scripts y procesos
+"""
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Dict, List, Optional, Union
+import numpy as np
+import pandas as pd
+from data_loader import memorizar_agregado
+from cubo import obtener_cubo, obtener_estadisticas, resumir, totales, valores_distintos
+
+SIMBOLO_MONEDA = "$"
+
+DIAS_ESPANOL = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+@dataclass(frozen=True)
+class Metrica:
+    """Un KPI: etiqueta, valor ya formateado (o entero) y delta opcional"""
+    etiqueta: str
+    valor: Union[str, int]
+    delta: Optional[str] = None
+
+@dataclass(frozen=True)
+class Insight:
+    """Un mensaje de análisis; `nivel` es info, success, warning o error"""
+    texto: str
+    nivel: str = 'info'
+
+@dataclass
+class TablasResumen:
+    """Estadísticas por plataforma y categoría, métricas generales y segundos por etapa"""
+    por_plataforma: pd.DataFrame
+    por_categoria: pd.DataFrame
+    generales: List[Metrica] = field(default_factory=list)
+    tiempos: Dict[str, float] = field(default_factory=dict)
+
+@dataclass
+class Analisis:
+    """Todos los resultados del dashboard para un DataFrame filtrado"""
+    metricas_principales: List[Metrica]
+    metricas_secundarias: List[Metrica]
+    tablas: Optional[TablasResumen]
+    insights_generales: List[Insight]
+    patrones: List[Metrica]
+    recomendaciones: List[Insight]
+    alertas: List[Insight]
+
+def formatear_moneda(valor):
+    """Formatea un importe con el símbolo de moneda y dos decimales"""
+    return f"{SIMBOLO_MONEDA}{valor:,.2f}"
+
+def formatear_moneda_lote(valores):
+    """
+    Igual que formatear_moneda, pero para un array o Serie completo: se
+    convierte a floats de Python de una vez y se formatea con un único
+    patrón, sin pasar celda a celda por pandas ni por una lambda
+    """
+    patron = f"{SIMBOLO_MONEDA}{{:,.2f}}".format
+    return list(map(patron, np.asarray(valores, dtype=np.float64).tolist()))
+
+def _recortar(texto, largo=20):
+    """Acorta un texto largo añadiendo puntos suspensivos"""
+    return texto[:largo] + "..." if len(texto) > largo else texto
+
+def calcular_metricas_principales(df_filtrado):
+    """
+    Total de compras, monto total y compras más cara y más barata
+    """
+    if df_filtrado.empty:
+        return [
+            Metrica("📦 Total de Compras", 0),
+            Metrica("💰 Monto Total Gastado", formatear_moneda(0)),
+            Metrica("🏆 Compra más Cara", formatear_moneda(0)),
+            Metrica("🎯 Compra más Barata", formatear_moneda(0))
+        ]
+
+    compra_cara = df_filtrado.loc[df_filtrado['total_compra'].idxmax()]
+    compra_barata = df_filtrado.loc[df_filtrado['total_compra'].idxmin()]
+
+    return [
+        Metrica("📦 Total de Compras", len(df_filtrado)),
+        Metrica("💰 Monto Total Gastado", formatear_moneda(obtener_cubo(df_filtrado)['suma'].sum())),
+        Metrica("🏆 Compra más Cara", formatear_moneda(compra_cara['total_compra']),
+                _recortar(compra_cara['producto'])),
+        Metrica("🎯 Compra más Barata", formatear_moneda(compra_barata['total_compra']),
+                _recortar(compra_barata['producto']))
+    ]
+
+def calcular_metricas_secundarias(df_filtrado):
+    """
+    Gasto promedio, plataformas, categorías y días con compras
+    """
+    if df_filtrado.empty:
+        return [
+            Metrica("📊 Gasto Promedio", formatear_moneda(0)),
+            Metrica("🛒 Plataformas", 0),
+            Metrica("🏷️ Categorías", 0),
+            Metrica("📅 Días de Compras", 0)
+        ]
+
+    cubo = obtener_cubo(df_filtrado)
+    total = totales(cubo)
+
+    return [
+        Metrica("📊 Gasto Promedio", formatear_moneda(total['promedio'])),
+        Metrica("🛒 Plataformas", valores_distintos(cubo, 'plataforma')),
+        Metrica("🏷️ Categorías", valores_distintos(cubo, 'categoria')),
+        Metrica("📅 Días de Compras", (total['fecha_max'] - total['fecha_min']).days)
+    ]
+
+def calcular_tablas_resumen(df_filtrado, aproximado=False):
+    """
+    Calcula las tablas por plataforma y categoría y las estadísticas
+    generales ya formateadas, a partir del cubo de agregados. Con
+    `aproximado` la mediana y los productos distintos salen de los bocetos
+    y se muestran con su error relativo.
+    """
+    tiempos = {}
+    inicio = time.perf_counter()
+
+    def marcar(etapa):
+        nonlocal inicio
+        ahora = time.perf_counter()
+        tiempos[etapa] = ahora - inicio
+        inicio = ahora
+
+    cubo = obtener_cubo(df_filtrado)
+    marcar('cubo')
+
+    # Todas las estadísticas generales de una vez (desde el cubo)
+    total = obtener_estadisticas(df_filtrado, aproximado)
+    marcar('estadisticas')
+
+    # Estadísticas por plataforma
+    plataforma_stats = resumir(cubo, 'plataforma')[
+        ['suma', 'promedio', 'conteo', 'maximo', 'minimo']
+    ].round(2)
+
+    # Renombrar columnas
+    plataforma_stats.columns = ['Total', 'Promedio', 'Cantidad', 'Máximo', 'Mínimo']
+
+    # Estadísticas por categoría
+    categoria_stats = resumir(cubo, 'categoria')[['suma', 'promedio', 'conteo']].round(2)
+
+    # Renombrar columnas
+    categoria_stats.columns = ['Total', 'Promedio', 'Cantidad']
+    marcar('tablas')
+
+    # Formatear valores (una columna entera por llamada)
+    for col in ['Total', 'Promedio', 'Máximo', 'Mínimo']:
+        plataforma_stats[col] = formatear_moneda_lote(plataforma_stats[col])
+    for col in ['Total', 'Promedio']:
+        categoria_stats[col] = formatear_moneda_lote(categoria_stats[col])
+
+    monto, promedio, mediana, desviacion = formatear_moneda_lote(
+        [total['suma'], total['promedio'], total['mediana'], total['desviacion']]
+    )
+
+    # Valores estimados con bocetos: se indica su error relativo
+    productos = total['productos']
+    if 'error_cuantil' in total:
+        mediana = f"≈{mediana} (±{total['error_cuantil']:.0%})"
+        productos = f"≈{productos:,} (±{total['error_distintos']:.1%})"
+
+    # Estadísticas generales
+    generales = [
+        Metrica('Total de Compras', len(df_filtrado)),
+        Metrica('Monto Total Gastado', monto),
+        Metrica('Gasto Promedio por Compra', promedio),
+        Metrica('Mediana de Gasto', mediana),
+        Metrica('Desviación Estándar', desviacion),
+        Metrica('Primera Compra', total['fecha_min'].strftime('%Y-%m-%d')),
+        Metrica('Última Compra', total['fecha_max'].strftime('%Y-%m-%d')),
+        Metrica('Días entre Compras', f"{(total['fecha_max'] - total['fecha_min']).days} días"),
+        Metrica('Plataformas Diferentes', total['plataformas']),
+        Metrica('Categorías Diferentes', total['categorias']),
+        Metrica('Productos Diferentes', productos)
+    ]
+    marcar('formato')
+
+    return TablasResumen(plataforma_stats, categoria_stats, generales, tiempos)
+
+def obtener_tablas_resumen(df_filtrado, aproximado=False):
+    """
+    Tablas de resumen calculadas una vez por estado de filtros (None si no hay datos)
+    """
+    if df_filtrado.empty:
+        return None
+    return memorizar_agregado(df_filtrado, 'tablas_resumen', calcular_tablas_resumen, aproximado)
+
+def generar_insight_gasto_mensual(df):
+    """Genera insight sobre patrones de gasto mensual"""
+    if df.empty:
+        return []
+
+    insights = []
+
+    # Agrupar por mes (desde el cubo de agregados)
+    gasto_mensual = resumir(obtener_cubo(df), 'mes')['suma'].rename('total_compra').reset_index()
+    gasto_mensual = gasto_mensual.sort_values('mes')
+
+    if len(gasto_mensual) > 1:
+        # Calcular tendencia
+        gasto_mensual['diferencia'] = gasto_mensual['total_compra'].diff()
+        crecimiento_promedio = gasto_mensual['diferencia'].mean()
+
+        if crecimiento_promedio > 0:
+            insights.append(f"📈 **Tendencia alcista**: Tu gasto mensual está aumentando en promedio {formatear_moneda(abs(crecimiento_promedio))} por mes")
+        elif crecimiento_promedio < 0:
+            insights.append(f"📉 **Tendencia bajista**: Tu gasto mensual está disminuyendo en promedio {formatear_moneda(abs(crecimiento_promedio))} por mes")
+        else:
+            insights.append("📊 **Estabilidad**: Tu gasto mensual se mantiene constante")
+
+        # Mes con mayor gasto
+        mes_max = gasto_mensual.loc[gasto_mensual['total_compra'].idxmax()]
+        insights.append(f"💰 **Mes pico**: {mes_max['mes']} fue el mes con mayor gasto ({formatear_moneda(mes_max['total_compra'])})")
+
+    return insights
+
+def generar_insight_plataformas(df):
+    """Genera insights sobre patrones por plataforma"""
+    if df.empty:
+        return []
+
+    insights = []
+
+    # Análisis por plataforma
+    cubo = obtener_cubo(df)
+    plataforma_stats = resumir(cubo, 'plataforma')[['suma', 'conteo', 'precio_promedio']].round(2)
+    plataforma_stats.columns = ['total_compra', 'producto', 'precio']
+
+    plataforma_stats = plataforma_stats.sort_values('total_compra', ascending=False)
+
+    # Plataforma favorita (más gasto)
+    plataforma_top = plataforma_stats.index[0]
+    gasto_top = plataforma_stats.iloc[0]['total_compra']
+    porcentaje_top = (gasto_top / totales(cubo)['suma']) * 100
+
+    insights.append(f"🏆 **Plataforma principal**: {plataforma_top} representa el {porcentaje_top:.1f}% de tu gasto total ({formatear_moneda(gasto_top)})")
+
+    # Plataforma con compras más frecuentes
+    plataforma_frecuente = plataforma_stats.sort_values('producto', ascending=False).index[0]
+    compras_frecuentes = plataforma_stats.sort_values('producto', ascending=False).iloc[0]['producto']
+
+    insights.append(f"🛒 **Plataforma frecuente**: {plataforma_frecuente} con {compras_frecuentes} compras realizadas")
+
+    return insights
+
+def generar_insight_categorias(df):
+    """Genera insights sobre patrones por categoría"""
+    if df.empty:
+        return []
+
+    insights = []
+
+    # Análisis por categoría
+    cubo = obtener_cubo(df)
+    categoria_stats = resumir(cubo, 'categoria')[['suma', 'conteo']].round(2)
+    categoria_stats.columns = ['total_compra', 'producto']
+
+    categoria_stats = categoria_stats.sort_values('total_compra', ascending=False)
+
+    # Categoría con mayor gasto
+    categoria_top = categoria_stats.index[0]
+    gasto_categoria_top = categoria_stats.iloc[0]['total_compra']
+    porcentaje_categoria = (gasto_categoria_top / totales(cubo)['suma']) * 100
+
+    insights.append(f"📦 **Categoría principal**: {categoria_top} absorbe el {porcentaje_categoria:.1f}% de tu presupuesto ({formatear_moneda(gasto_categoria_top)})")
+
+    # Diversidad de categorías
+    num_categorias = len(categoria_stats)
+    if num_categorias >= 5:
+        insights.append(f"🌈 **Diversificación**: Compras en {num_categorias} categorías diferentes, buena variedad")
+    elif num_categorias >= 3:
+        insights.append(f"🎯 **Enfoque moderado**: Compras en {num_categorias} categorías principales")
+    else:
+        insights.append(f"🎯 **Alto enfoque**: Concentras tus compras en solo {num_categorias} categorías")
+
+    return insights
+
+def generar_insight_temporal(df):
+    """Genera insights sobre patrones temporales"""
+    if df.empty:
+        return []
+
+    insights = []
+
+    # Día de la semana preferido (0 = lunes)
+    compras_por_dia = resumir(obtener_cubo(df), 'dia_semana_num')['suma'].reindex(range(7))
+    dia_max = compras_por_dia.idxmax()
+    gasto_dia_max = compras_por_dia.max()
+
+    insights.append(f"📅 **Día preferido**: {DIAS_ESPANOL[dia_max]} es cuando más gastas ({formatear_moneda(gasto_dia_max)})")
+
+    return insights
+
+def _frecuencia_compras(df):
+    """Días promedio entre compras consecutivas"""
+    return df.sort_values('fecha')['fecha'].diff().dt.days.mean()
+
+def generar_recomendaciones(df):
+    """Genera recomendaciones basadas en los datos"""
+    if df.empty:
+        return []
+
+    recomendaciones = []
+
+    cubo = obtener_cubo(df)
+
+    # 1. Recomendación basada en gasto por plataforma
+    plataforma_stats = resumir(cubo, 'plataforma')['suma']
+    if len(plataforma_stats) > 1:
+        plataforma_max = plataforma_stats.idxmax()
+        plataforma_min = plataforma_stats.idxmin()
+
+        if plataforma_stats.max() / plataforma_stats.min() > 5:  # Si hay mucha diferencia
+            recomendaciones.append(f"⚖️ **Considera diversificar**: {plataforma_max} representa una gran parte de tu gasto. Podrías explorar más opciones en {plataforma_min}")
+
+    # 2. Recomendación basada en categorías
+    categoria_stats = resumir(cubo, 'categoria')['suma']
+    if len(categoria_stats) < 3:
+        recomendaciones.append("🛍️ **Amplía tus categorías**: Estás comprando en pocas categorías. Considera explorar nuevas áreas de interés")
+
+    # 3. Recomendación basada en frecuencia
+    frecuencia_promedio = _frecuencia_compras(df)
+
+    if frecuencia_promedio < 3:
+        recomendaciones.append("⏰ **Control de impulsos**: Compras con mucha frecuencia. Considera esperar 24h antes de compras no esenciales")
+    elif frecuencia_promedio > 30:
+        recomendaciones.append("🎯 **Planificación**: Compras con poca frecuencia. Podrías planificar compras mayores para ahorrar en envíos")
+
+    return recomendaciones
+
+def generar_alertas(df):
+    """Genera alertas importantes basadas en los datos"""
+    if df.empty:
+        return []
+
+    alertas = []
+
+    # 1. Alerta de gasto excesivo reciente
+    ultimo_mes = df['fecha'].max()
+    hace_30_dias = ultimo_mes - timedelta(days=30)
+    compras_recientes = df[df['fecha'] >= hace_30_dias]
+
+    if not compras_recientes.empty:
+        gasto_reciente = compras_recientes['total_compra'].sum()
+        gasto_promedio_mensual = df['total_compra'].sum() / (len(df) / 30)  # Aproximación
+
+        if gasto_reciente > gasto_promedio_mensual * 1.5:
+            alertas.append(f"🚨 **Gasto elevado reciente**: En los últimos 30 días gastaste {formatear_moneda(gasto_reciente)}, mucho más que tu promedio mensual")
+
+    # 2. Alerta de compras repetitivas
+    productos_frecuentes = df['producto'].value_counts()
+    if productos_frecuentes.max() >= 3:
+        producto_repetido = productos_frecuentes.idxmax()
+        alertas.append(f"🔄 **Producto repetido**: '{producto_repetido}' lo has comprado {productos_frecuentes.max()} veces")
+
+    return alertas
+
+def generar_insights_generales(df):
+    """Reúne los insights de gasto mensual, plataformas, categorías y tiempo"""
+    todos_insights = []
+    todos_insights.extend(generar_insight_gasto_mensual(df))
+    todos_insights.extend(generar_insight_plataformas(df))
+    todos_insights.extend(generar_insight_categorias(df))
+    todos_insights.extend(generar_insight_temporal(df))
+
+    return todos_insights
+
+def calcular_insights_generales(df):
+    """Insights generales, una vez por estado de filtros"""
+    textos = memorizar_agregado(df, 'insights_generales', generar_insights_generales)
+    return [Insight(texto, 'info') for texto in textos]
+
+def calcular_patrones_compras(df):
+    """Día preferido, frecuencia de compras y número de compras"""
+    if df.empty:
+        return []
+
+    compras_por_dia = resumir(obtener_cubo(df), 'dia_semana_num')['suma'].reindex(range(7), fill_value=0)
+
+    return [
+        Metrica("📅 Día preferido", DIAS_ESPANOL[compras_por_dia.idxmax()]),
+        Metrica("⏰ Frecuencia", f"{memorizar_agregado(df, 'frecuencia', _frecuencia_compras):.1f} días"),
+        Metrica("🛒 Compras totales", len(df))
+    ]
+
+def calcular_recomendaciones(df):
+    """Recomendaciones, o un mensaje de hábitos balanceados si no hay ninguna"""
+    recomendaciones = memorizar_agregado(df, 'recomendaciones', generar_recomendaciones)
+
+    if not recomendaciones:
+        return [Insight("Tus hábitos de compra parecen balanceados. ¡Sigue así!", 'info')]
+    return [Insight(texto, 'success') for texto in recomendaciones]
+
+def calcular_alertas(df):
+    """Alertas (críticas como error y el resto como aviso), o un mensaje de todo en orden"""
+    alertas = memorizar_agregado(df, 'alertas', generar_alertas)
+
+    if not alertas:
+        return [Insight("✅ No se detectaron alertas críticas en tus patrones de compra", 'success')]
+    return [Insight(texto, 'error' if "🚨" in texto else 'warning') for texto in alertas]
+
+def analizar(df_filtrado):
+    """
+    Calcula todas las métricas, tablas e insights del dashboard
+    """
+    hay_datos = not df_filtrado.empty
+
+    return Analisis(
+        metricas_principales=calcular_metricas_principales(df_filtrado),
+        metricas_secundarias=calcular_metricas_secundarias(df_filtrado),
+        tablas=obtener_tablas_resumen(df_filtrado),
+        insights_generales=calcular_insights_generales(df_filtrado) if hay_datos else [],
+        patrones=calcular_patrones_compras(df_filtrado),
+        recomendaciones=calcular_recomendaciones(df_filtrado) if hay_datos else [],
+        alertas=calcular_alertas(df_filtrado) if hay_datos else []
+    )
@@ -1,12 +1,28 @@
 """
 Dashboard de Compras Online - Archivo principal
 """
+import os
+import time
+import uuid
+import pandas as pd
 import streamlit as st
 from data_loader import *
+from ingesta import es_multiple, limites_fragmentos, listar_fragmentos
+from almacen import es_particionado
+from bocetos import obtener_bocetos
+from detalle import FILAS_POR_PAGINA, TITULOS_DETALLE, pagina_detalle
+from exportacion import FORMATOS_EXPORTACION, exportar, formatos_disponibles, ruta_exportacion
 from metrics import *
 from charts import *
 from insights import *
 
+# Copy-on-Write: los DataFrames derivados (filtros, columnas nuevas,
+# bloques con categorías unificadas) comparten los datos del original sin
+# copiarlos, y escribir en uno nunca modifica otro. Así el dataset y los
+# resultados en caché se pueden compartir entre sesiones e hilos sin copias
+# defensivas; los arrays que devuelve to_numpy() son de solo lectura.
+pd.set_option('mode.copy_on_write', True)
+
 # Configuración de la página
 st.set_page_config(
     page_title="Dashboard de Compras Online",
@@ -23,20 +39,77 @@ st.markdown("Analiza tus hábitos de gasto en diferentes plataformas de comercio
 st.sidebar.header("🔍 Filtros")
 
 # Subir archivo personalizado
-archivo_subido = st.sidebar.file_uploader("Subir archivo JSON o CSV", type=['json', 'csv'])
+archivo_subido = st.sidebar.file_uploader("Subir archivo JSON, JSONL o CSV", type=['json', 'jsonl', 'csv'])
 
-# Cargar datos
-if archivo_subido:
-    df = cargar_datos_subidos(archivo_subido)
-else:
-    df = cargar_datos('compras.json')
+# Origen de los datos: un archivo, o un directorio / patrón glob de
+# fragmentos, siempre dentro del directorio de datos (DIRECTORIO_DATOS)
+texto_origen = st.sidebar.text_input("📂 Archivo, directorio o patrón de datos", 'compras.json')
+try:
+    origen = resolver_origen(texto_origen)
+except ValueError as e:
+    if not archivo_subido:
+        st.error(str(e))
+        st.stop()
+    origen = None
 
-if df.empty:
-    st.warning("No hay datos para mostrar. Por favor, sube un archivo o verifica 'compras.json'.")
-    st.stop()
+# Un almacén particionado (ver almacen.py) no se carga entero: las opciones
+# de los filtros salen de su resumen y cada filtro se aplica en la lectura
+particionado = not archivo_subido and es_particionado(origen)
 
-# Obtener opciones para filtros
-plataformas, categorias = obtener_opciones_filtros(df)
+# Con fragmentos fechados se puede leer solo el rango de fechas elegido
+rango_carga = None
+if not archivo_subido and not particionado and es_multiple(origen):
+    limites = limites_fragmentos(listar_fragmentos(origen))
+    if limites is not None and st.sidebar.checkbox("Cargar solo los fragmentos del rango de fechas"):
+        rango_carga = st.sidebar.date_input(
+            "Rango de Fechas", [limites[0].date(), limites[1].date()], key='rango_carga'
+        )
+
+# Identificador de la sesión para la cuenta de referencias de los datasets
+# compartidos; el testigo la libera cuando Streamlit descarta la sesión
+if 'id_sesion' not in st.session_state:
+    st.session_state['id_sesion'] = uuid.uuid4().hex
+    st.session_state['testigo_sesion'] = TestigoSesion(st.session_state['id_sesion'])
+
+# Cargar datos
+try:
+    if particionado:
+        plataformas, categorias, (fecha_min, fecha_max) = opciones_filtros_particionado(origen)
+        df = None
+        DATASETS.liberar(st.session_state['id_sesion'])
+    elif archivo_subido:
+        df = cargar_datos_subidos(archivo_subido, sesion=st.session_state['id_sesion'])
+    else:
+        # La huella (ruta + tamaño + fecha de modificación de cada archivo)
+        # invalida la caché cuando cambia alguno; todas las sesiones
+        # comparten el mismo DataFrame de solo lectura
+        try:
+            huella = huella_origen(origen, rango_carga)
+        except OSError:
+            huella = None
+        df = cargar_datos_compartidos(origen, huella, rango_carga, sesion=st.session_state['id_sesion'])
+except (ErrorCargaDatos, OSError, ValueError) as e:
+    st.error(str(e))
+    df = pd.DataFrame()
+
+if df is not None:
+    if df.empty:
+        st.warning(f"No hay datos para mostrar. Por favor, sube un archivo o verifica '{texto_origen}'.")
+        st.stop()
+    
+    # Memoria utilizada durante la carga por bloques
+    if 'ingesta' in df.attrs:
+        st.sidebar.caption(f"💾 Memoria pico de carga: {df.attrs['ingesta']['memoria_pico_mb']:,.1f} MB")
+    
+    # Ahorro de memoria del esquema compacto (se calcula una vez por dataset:
+    # memory_usage(deep=True) recorre todas las filas)
+    with st.sidebar.expander("💾 Memoria por columna"):
+        st.dataframe(memorizar_por_dataset(df, 'reporte_memoria', reporte_memoria), width='stretch')
+    
+    # Obtener opciones para filtros
+    plataformas, categorias = obtener_opciones_filtros(df)
+    fecha_min = df['fecha'].min().date()
+    fecha_max = df['fecha'].max().date()
 
 # Filtro por plataforma
 plataforma_seleccionada = st.sidebar.selectbox("Seleccionar Plataforma", plataformas)
@@ -44,18 +117,49 @@ plataforma_seleccionada = st.sidebar.selectbox("Seleccionar Plataforma", platafo
 # Filtro por categoría
 categoria_seleccionada = st.sidebar.selectbox("Seleccionar Categoría", categorias)
 
-# Filtro por rango de fechas
-fecha_min = df['fecha'].min().date()
-fecha_max = df['fecha'].max().date()
-rango_fechas = st.sidebar.date_input("Rango de Fechas", [fecha_min, fecha_max])
+# Filtro por rango de fechas (si ya se eligió para la carga, se reutiliza)
+if rango_carga is not None:
+    rango_fechas = rango_carga
+else:
+    rango_fechas = st.sidebar.date_input("Rango de Fechas", [fecha_min, fecha_max])
+
+# Modo aproximado: mediana y productos distintos desde bocetos precalculados
+# por plataforma × categoría × mes (no disponible en almacenes particionados)
+aproximado = st.sidebar.toggle(
+    "⚡ Estadísticas aproximadas",
+    disabled=particionado,
+    help="Estima la mediana (±1 %) y los productos distintos (±1.6 %) sin recorrer todas las compras filtradas"
+)
+if aproximado and not particionado:
+    obtener_bocetos(df)
+
+# Las cachés de filtros y de gráficos son de todo el proceso y sus claves
+# incluyen la huella del dataset: al cambiar de dataset no se invalidan (otras
+# sesiones pueden seguir usándolo); lo que nadie usa lo desaloja el LRU
 
-# Aplicar filtros
-df_filtrado = aplicar_filtros(df, plataforma_seleccionada, categoria_seleccionada, rango_fechas)
+# Aplicar filtros (memorizados por dataset y estado de filtros); en un
+# almacén particionado se leen de disco solo las compras que los cumplen
+if particionado:
+    df_filtrado = aplicar_filtros_particionado(origen, plataforma_seleccionada, categoria_seleccionada, rango_fechas)
+else:
+    df_filtrado = aplicar_filtros_con_cache(df, plataforma_seleccionada, categoria_seleccionada, rango_fechas)
+
+# Sección principal del dashboard: la pestaña elegida se guarda en el
+# estado y solo se calcula y dibuja esa (los resultados de cada una se
+# memorizan por estado de filtros, así que volver a ella es inmediato)
+PESTANAS = ["📊 Resumen", "📈 Gráficos", "📋 Detalles", "⚙️ Análisis", "🤖 Insight Automático"]
+pestana = st.radio("Sección", PESTANAS, horizontal=True, key='pestana', label_visibility='collapsed')
+
+# Streamlit descarta el estado de los widgets que no se dibujan; al
+# reasignarlo se conservan la búsqueda, el orden y la página del detalle
+for clave in ['busqueda_detalle', 'orden_detalle', 'descendente_detalle', 'filas_detalle',
+              'pagina_detalle', 'formato_exportacion']:
+    if clave in st.session_state:
+        st.session_state[clave] = st.session_state[clave]
 
-# Sección principal del dashboard
-tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Resumen", "📈 Gráficos", "📋 Detalles", "⚙️ Análisis", "🤖 Insight Automático"])
+inicio_pestana = time.perf_counter()
 
-with tab1:
+if pestana == PESTANAS[0]:
     # Métricas principales
     st.header("📊 Métricas Principales")
     mostrar_metricas_principales(df_filtrado)
@@ -67,28 +171,28 @@ with tab1:
     mostrar_metricas_secundarias(df_filtrado)
     
     # Resumen estadístico
-    mostrar_resumen_estadistico(df_filtrado)
+    mostrar_resumen_estadistico(df_filtrado, aproximado)
 
-with tab2:
+if pestana == PESTANAS[1]:
     st.header("📈 Visualizaciones Gráficas")
     
     # Gráficos básicos
     col1, col2 = st.columns(2)
     
     with col1:
-        fig_mensual = crear_grafico_gasto_mensual(df_filtrado)
+        fig_mensual = grafico_en_cache(crear_grafico_gasto_mensual, df_filtrado)
         if fig_mensual:
             # CORREGIDO: Sin use_container_width
             st.plotly_chart(fig_mensual)
     
     with col2:
-        fig_plataformas = crear_grafico_plataformas(df_filtrado)
+        fig_plataformas = grafico_en_cache(crear_grafico_plataformas, df_filtrado)
         if fig_plataformas:
             # CORREGIDO: Sin use_container_width
             st.plotly_chart(fig_plataformas)
     
     # Gráfico de categorías
-    fig_categorias = crear_grafico_categorias(df_filtrado)
+    fig_categorias = grafico_en_cache(crear_grafico_categorias, df_filtrado)
     if fig_categorias:
         # CORREGIDO: Sin use_container_width
         st.plotly_chart(fig_categorias)
@@ -98,54 +202,111 @@ with tab2:
     col3, col4 = st.columns(2)
     
     with col3:
-        fig_tendencias = crear_grafico_tendencias(df_filtrado)
+        fig_tendencias = grafico_en_cache(crear_grafico_tendencias, df_filtrado)
         if fig_tendencias:
             # CORREGIDO: Sin use_container_width
             st.plotly_chart(fig_tendencias)
     
     with col4:
-        fig_distribucion = crear_grafico_distribucion_precios(df_filtrado)
+        fig_distribucion = grafico_en_cache(crear_grafico_distribucion_precios, df_filtrado)
         if fig_distribucion:
             # CORREGIDO: Sin use_container_width
             st.plotly_chart(fig_distribucion)
 
-with tab3:
+if pestana == PESTANAS[2]:
     st.header("📋 Detalle de Compras")
     
     if not df_filtrado.empty:
-        # Formatear tabla para mostrar
-        df_mostrar = df_filtrado.copy()
-        df_mostrar['fecha'] = df_mostrar['fecha'].dt.strftime('%Y-%m-%d')
-        df_mostrar['precio'] = df_mostrar['precio'].apply(lambda x: f"{SIMBOLO_MONEDA}{x:,.2f}")
-        df_mostrar['total_compra'] = df_mostrar['total_compra'].apply(lambda x: f"{SIMBOLO_MONEDA}{x:,.2f}")
-        
-        # Renombrar columnas
-        df_mostrar = df_mostrar.rename(columns={
-            'fecha': 'Fecha',
-            'plataforma': 'Plataforma',
-            'producto': 'Producto',
-            'categoria': 'Categoría',
-            'cantidad': 'Cantidad',
-            'precio': 'Precio Unitario',
-            'total_compra': 'Total Compra'
-        })
-        
-        # CORREGIDO: width='stretch' en lugar de use_container_width
-        st.dataframe(df_mostrar, hide_index=True, width='stretch')
-        
-        # Opción para descargar - CORREGIDO
-        csv = df_filtrado.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="📥 Descargar datos filtrados (CSV)",
-            data=csv,
-            file_name="compras_filtradas.csv",
-            mime="text/csv",
-            width='stretch'
+        # Búsqueda, ordenación y paginación se resuelven en el servidor:
+        # al navegador solo se envía la página visible
+        col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+        with col1:
+            busqueda = st.text_input("🔎 Buscar producto", key='busqueda_detalle')
+        with col2:
+            columna_orden = st.selectbox("Ordenar por", list(TITULOS_DETALLE),
+                                         format_func=TITULOS_DETALLE.get, key='orden_detalle')
+        with col3:
+            descendente = st.toggle("Descendente", key='descendente_detalle')
+        with col4:
+            filas_por_pagina = st.selectbox("Filas", FILAS_POR_PAGINA, key='filas_detalle')
+        
+        pagina = st.session_state.get('pagina_detalle', 1)
+        df_pagina, total_filas = pagina_detalle(df_filtrado, pagina, filas_por_pagina,
+                                                columna_orden, not descendente, busqueda)
+        paginas = max(1, -(-total_filas // filas_por_pagina))
+        
+        # Si la página guardada ya no existe (otros filtros o búsqueda) se vuelve a la primera
+        if pagina > paginas:
+            pagina = st.session_state['pagina_detalle'] = 1
+            df_pagina, total_filas = pagina_detalle(df_filtrado, pagina, filas_por_pagina,
+                                                    columna_orden, not descendente, busqueda)
+        
+        # Formato de columnas en el navegador en lugar de convertir números a texto
+        formato_moneda = 'dollar' if SIMBOLO_MONEDA == '$' else f"{SIMBOLO_MONEDA}%.2f"
+        st.dataframe(
+            df_pagina,
+            hide_index=True,
+            width='stretch',
+            column_config={
+                'fecha': st.column_config.DateColumn(TITULOS_DETALLE['fecha'], format='YYYY-MM-DD'),
+                'plataforma': TITULOS_DETALLE['plataforma'],
+                'producto': TITULOS_DETALLE['producto'],
+                'categoria': TITULOS_DETALLE['categoria'],
+                'cantidad': st.column_config.NumberColumn(TITULOS_DETALLE['cantidad']),
+                'precio': st.column_config.NumberColumn(TITULOS_DETALLE['precio'], format=formato_moneda),
+                'total_compra': st.column_config.NumberColumn(TITULOS_DETALLE['total_compra'], format=formato_moneda)
+            }
         )
+        
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            st.number_input("Página", min_value=1, max_value=paginas, step=1, key='pagina_detalle')
+        with col2:
+            if total_filas:
+                inicio = (pagina - 1) * filas_por_pagina
+                st.caption(f"Filas {inicio + 1:,}–{inicio + len(df_pagina):,} de {total_filas:,} "
+                           f"(página {pagina} de {paginas})")
+            else:
+                st.caption(f"Ningún producto contiene '{busqueda}'")
+        
+        # Exportación: el archivo se escribe por bloques en disco solo al
+        # pedirlo y se reutiliza mientras no cambien los filtros
+        col1, col2 = st.columns([2, 1], vertical_alignment='bottom')
+        with col1:
+            formato = st.selectbox("Formato de exportación", formatos_disponibles(),
+                                   format_func=lambda f: FORMATOS_EXPORTACION[f][0],
+                                   key='formato_exportacion')
+        descripcion, extension, mime = FORMATOS_EXPORTACION[formato]
+        
+        identificador = (estado_filtros(df_filtrado), formato)
+        preparada = st.session_state.get('exportacion')
+        if (preparada is not None and identificador[0] is not None and preparada[0] == identificador
+                and os.path.exists(preparada[1])):
+            ruta = preparada[1]
+        else:
+            ruta = ruta_exportacion(df_filtrado, formato)
+            if ruta is not None and not os.path.exists(ruta):
+                ruta = None
+        
+        with col2:
+            if ruta is None and st.button("⚙️ Preparar descarga", width='stretch'):
+                with st.spinner(f"Generando {descripcion}..."):
+                    ruta = exportar(df_filtrado, formato)
+                st.session_state['exportacion'] = (identificador, ruta)
+            
+            if ruta is not None:
+                with open(ruta, 'rb') as archivo_exportado:
+                    st.download_button(
+                        label=f"📥 Descargar datos filtrados ({descripcion})",
+                        data=archivo_exportado,
+                        file_name=f"compras_filtradas{extension}",
+                        mime=mime,
+                        width='stretch'
+                    )
     else:
         st.warning("No hay datos que coincidan con los filtros seleccionados")
 
-with tab4:
+if pestana == PESTANAS[3]:
     st.header("⚙️ Análisis Avanzado")
     
     if not df_filtrado.empty:
@@ -153,14 +314,14 @@ with tab4:
         
         with col1:
             st.subheader("📅 Heatmap de Gasto")
-            fig_heatmap = crear_grafico_heatmap_calendario(df_filtrado)
+            fig_heatmap = grafico_en_cache(crear_grafico_heatmap_calendario, df_filtrado)
             if fig_heatmap:
                 # CORREGIDO: Sin use_container_width
                 st.plotly_chart(fig_heatmap)
         
         with col2:
             st.subheader("🏆 Top Productos")
-            fig_top = crear_grafico_top_productos(df_filtrado, top_n=10)
+            fig_top = grafico_en_cache(crear_grafico_top_productos, df_filtrado, top_n=10)
             if fig_top:
                 # CORREGIDO: Sin use_container_width
                 st.plotly_chart(fig_top)
@@ -168,7 +329,7 @@ with tab4:
         st.warning("No hay datos para análisis avanzado")
 
 # NUEVA PESTAÑA: Insight Automático
-with tab5:
+if pestana == PESTANAS[4]:
     st.header("🤖 Insight Automático")
     st.markdown("Análisis inteligente automatizado de tus patrones de compra")
     
@@ -197,6 +358,40 @@ with tab5:
     else:
         st.warning("No hay datos suficientes para generar insights automáticos")
 
+# Tiempo de la pestaña mostrada y de la última vez que se mostró cada una
+tiempos_pestanas = st.session_state.setdefault('tiempos_pestanas', {})
+tiempos_pestanas[pestana] = time.perf_counter() - inicio_pestana
+st.caption(f"⏱️ {pestana} en {tiempos_pestanas[pestana] * 1000:.1f} ms")
+
+with st.sidebar.expander("⏱️ Tiempos por pestaña"):
+    st.dataframe(
+        pd.DataFrame({'ms': {nombre: round(segundos * 1000, 1) for nombre, segundos in tiempos_pestanas.items()}}),
+        width='stretch'
+    )
+
+# Bytes enviados al navegador por cada gráfico de los filtros actuales
+tamanos = tamanos_graficos(df_filtrado)
+if tamanos:
+    with st.sidebar.expander("📦 Tamaño de los gráficos"):
+        st.dataframe(
+            pd.DataFrame({'KB': {nombre: round(tamano / 1024, 1) for nombre, tamano in tamanos.items()}}),
+            width='stretch'
+        )
+
+# Estadísticas de la caché de filtros (al final, tras usar la pestaña)
+with st.sidebar.expander("⚡ Caché de filtros"):
+    st.json(CACHE_FILTROS.estadisticas())
+
+with st.sidebar.expander("🖼️ Caché de gráficos"):
+    st.json(CACHE_GRAFICOS.estadisticas())
+
+# Datasets en memoria compartidos por todas las sesiones
+with st.sidebar.expander("🗄️ Datasets compartidos"):
+    reporte_datasets = DATASETS.reporte()
+    if reporte_datasets:
+        st.dataframe(pd.DataFrame(reporte_datasets).set_index('dataset'), width='stretch')
+    st.json(DATASETS.estadisticas())
+
 # Información en el sidebar
 st.sidebar.markdown("---")
 st.sidebar.info("""
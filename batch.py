@@ -0,0 +1,224 @@
+"""
+Generación de reportes en lote: ejecuta carga → filtros → métricas →
+gráficos → insights para cada archivo de compras de un directorio, en
+paralelo, y guarda los resultados en disco
+
+Uso:
+    python batch.py cuentas/ --salida reportes/ --procesos 8
+    python batch.py cuentas/ --salida reportes/ --plataforma Amazon --desde 2024-01-01 --hasta 2024-06-30
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict
+import pandas as pd
+import charts
+from analisis import (calcular_alertas, calcular_insights_generales, calcular_metricas_principales,
+                      calcular_metricas_secundarias, calcular_patrones_compras,
+                      calcular_recomendaciones, obtener_tablas_resumen)
+from data_loader import ErrorCargaDatos, aplicar_filtros_con_cache, cargar_datos
+from ingesta import EXTENSIONES
+
+# Copy-on-Write, como en app.py (también en los procesos del pool, que
+# importan este módulo)
+pd.set_option('mode.copy_on_write', True)
+
+ETAPAS = ['carga', 'filtros', 'metricas', 'graficos', 'insights', 'escritura']
+
+GRAFICOS = {
+    'gasto_mensual': charts.crear_grafico_gasto_mensual,
+    'plataformas': charts.crear_grafico_plataformas,
+    'categorias': charts.crear_grafico_categorias,
+    'tendencias': charts.crear_grafico_tendencias,
+    'distribucion_precios': charts.crear_grafico_distribucion_precios,
+    'top_productos': charts.crear_grafico_top_productos,
+    'heatmap_calendario': charts.crear_grafico_heatmap_calendario
+}
+
+def listar_archivos(directorio):
+    """
+    Archivos de compras del directorio (JSON, JSON Lines o CSV), ordenados
+    """
+    return sorted(
+        os.path.join(directorio, nombre) for nombre in os.listdir(directorio)
+        if nombre.lower().endswith(EXTENSIONES) and os.path.isfile(os.path.join(directorio, nombre))
+    )
+
+def _tabla_a_dict(tabla):
+    """
+    Tabla de resumen como {fila: {columna: valor}} serializable en JSON
+    """
+    return {str(fila): {col: (valor.item() if hasattr(valor, 'item') else valor)
+                        for col, valor in valores.items()}
+            for fila, valores in tabla.to_dict(orient='index').items()}
+
+def procesar_archivo(archivo, directorio_salida, plataforma='Todas', categoria='Todas',
+                     rango_fechas=(), usar_cache=True):
+    """
+    Ejecuta el pipeline completo para un archivo y escribe en
+    `directorio_salida/<nombre con extensión>/` el reporte (KPIs, tablas e
+    insights) y una figura Plotly serializada por gráfico. Devuelve los
+    tiempos por etapa.
+    """
+    tiempos = {}
+    inicio = time.perf_counter()
+
+    def marcar(etapa):
+        nonlocal inicio
+        ahora = time.perf_counter()
+        tiempos[etapa] = ahora - inicio
+        inicio = ahora
+
+    df = cargar_datos(archivo, usar_cache=usar_cache)
+    if df.empty:
+        raise ValueError(f"{archivo} no contiene compras")
+    marcar('carga')
+
+    if not rango_fechas:
+        rango_fechas = (df['fecha'].min().date(), df['fecha'].max().date())
+    df_filtrado = aplicar_filtros_con_cache(df, plataforma, categoria, rango_fechas)
+    marcar('filtros')
+
+    tablas = obtener_tablas_resumen(df_filtrado)
+    reporte = {
+        'archivo': os.path.abspath(archivo),
+        'huella': df.attrs.get('huella'),
+        'filtros': {
+            'plataforma': plataforma,
+            'categoria': categoria,
+            'rango_fechas': [str(fecha) for fecha in rango_fechas]
+        },
+        'filas': len(df),
+        'filas_filtradas': len(df_filtrado),
+        'metricas_principales': [asdict(m) for m in calcular_metricas_principales(df_filtrado)],
+        'metricas_secundarias': [asdict(m) for m in calcular_metricas_secundarias(df_filtrado)],
+        'estadisticas_generales': [asdict(m) for m in tablas.generales] if tablas else [],
+        'por_plataforma': _tabla_a_dict(tablas.por_plataforma) if tablas else {},
+        'por_categoria': _tabla_a_dict(tablas.por_categoria) if tablas else {}
+    }
+    marcar('metricas')
+
+    figuras = {}
+    if not df_filtrado.empty:
+        for nombre, crear in GRAFICOS.items():
+            figura = crear(df_filtrado)
+            if figura is not None:
+                figuras[nombre] = charts.json_figura(figura)
+    marcar('graficos')
+
+    if not df_filtrado.empty:
+        reporte['insights_generales'] = [asdict(i) for i in calcular_insights_generales(df_filtrado)]
+        reporte['patrones'] = [asdict(m) for m in calcular_patrones_compras(df_filtrado)]
+        reporte['recomendaciones'] = [asdict(i) for i in calcular_recomendaciones(df_filtrado)]
+        reporte['alertas'] = [asdict(i) for i in calcular_alertas(df_filtrado)]
+    marcar('insights')
+
+    # Con la extensión, para que ana.json y ana.csv no compartan directorio
+    destino = os.path.join(directorio_salida, os.path.basename(archivo))
+    os.makedirs(os.path.join(destino, 'figuras'), exist_ok=True)
+    with open(os.path.join(destino, 'reporte.json'), 'w', encoding='utf-8') as f:
+        json.dump(reporte, f, indent=2, ensure_ascii=False, default=str)
+    for nombre, figura in figuras.items():
+        with open(os.path.join(destino, 'figuras', f"{nombre}.json"), 'w', encoding='utf-8') as f:
+            f.write(figura)
+    marcar('escritura')
+
+    return {'archivo': archivo, 'destino': destino, 'filas': len(df), 'tiempos': tiempos}
+
+def ejecutar_lote(archivos, directorio_salida, procesos=None, **opciones):
+    """
+    Procesa los archivos en un pool de procesos y devuelve el resumen con
+    throughput (archivos/s), tiempos por etapa y errores
+    """
+    os.makedirs(directorio_salida, exist_ok=True)
+    inicio = time.perf_counter()
+    resultados = []
+    errores = []
+
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        futuros = {
+            pool.submit(procesar_archivo, archivo, directorio_salida, **opciones): archivo
+            for archivo in archivos
+        }
+        for futuro in as_completed(futuros):
+            archivo = futuros[futuro]
+            # Cualquier fallo (incluido un proceso del pool que muere) se
+            # anota y el lote continúa, para escribir siempre el resumen
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                error = str(e) if isinstance(e, ErrorCargaDatos) else f"{type(e).__name__}: {e}"
+                errores.append({'archivo': archivo, 'error': error})
+                print(f"✗ {archivo}: {error}")
+                continue
+            resultados.append(resultado)
+            print(f"✓ {archivo} ({resultado['filas']:,} filas, "
+                  f"{sum(resultado['tiempos'].values()):.2f} s)")
+
+    duracion = time.perf_counter() - inicio
+
+    etapas = {}
+    for etapa in ETAPAS:
+        valores = [r['tiempos'][etapa] for r in resultados if etapa in r['tiempos']]
+        if valores:
+            etapas[etapa] = {
+                'total_s': round(sum(valores), 4),
+                'promedio_s': round(sum(valores) / len(valores), 4),
+                'maximo_s': round(max(valores), 4)
+            }
+
+    resumen = {
+        'archivos': len(archivos),
+        'procesados': len(resultados),
+        'errores': errores,
+        'procesos': procesos or os.cpu_count(),
+        'duracion_s': round(duracion, 3),
+        'archivos_por_s': round(len(resultados) / duracion, 3) if duracion else 0.0,
+        'filas_por_s': round(sum(r['filas'] for r in resultados) / duracion, 1) if duracion else 0.0,
+        'etapas': etapas
+    }
+
+    with open(os.path.join(directorio_salida, 'resumen.json'), 'w', encoding='utf-8') as f:
+        json.dump(resumen, f, indent=2, ensure_ascii=False)
+
+    return resumen
+
+def main():
+    parser = argparse.ArgumentParser(description="Reportes en lote del dashboard de compras")
+    parser.add_argument('directorio', help="Directorio con un archivo de compras por cuenta")
+    parser.add_argument('--salida', default='reportes', help="Directorio donde escribir los reportes")
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos en paralelo (por defecto, uno por CPU)")
+    parser.add_argument('--plataforma', default='Todas')
+    parser.add_argument('--categoria', default='Todas')
+    parser.add_argument('--desde', help="Fecha inicial (AAAA-MM-DD)")
+    parser.add_argument('--hasta', help="Fecha final (AAAA-MM-DD)")
+    parser.add_argument('--sin-cache', action='store_true', help="No leer ni escribir la caché en disco")
+
+    args = parser.parse_args()
+
+    archivos = listar_archivos(args.directorio)
+    if not archivos:
+        parser.error(f"No hay archivos JSON, JSONL o CSV en {args.directorio}")
+    if bool(args.desde) != bool(args.hasta):
+        parser.error("--desde y --hasta deben indicarse juntos")
+
+    resumen = ejecutar_lote(
+        archivos,
+        args.salida,
+        procesos=args.procesos,
+        plataforma=args.plataforma,
+        categoria=args.categoria,
+        rango_fechas=(args.desde, args.hasta) if args.desde else (),
+        usar_cache=not args.sin_cache
+    )
+
+    print(f"\n{resumen['procesados']}/{resumen['archivos']} archivos en {resumen['duracion_s']:.2f} s "
+          f"({resumen['archivos_por_s']:.2f} archivos/s, {resumen['filas_por_s']:,.0f} filas/s)")
+    for etapa, tiempos in resumen['etapas'].items():
+        print(f"    {etapa:<10} total {tiempos['total_s']:8.3f} s | "
+              f"promedio {tiempos['promedio_s']:8.4f} s | máximo {tiempos['maximo_s']:8.4f} s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,438 @@
+"""
+Benchmarks del procesamiento de datos del dashboard
+
+Uso:
+    python benchmark.py fechas --filas 1000000 10000000
+    python benchmark.py pipeline --filas 10000 1000000 10000000 --salida resultados.json
+    python benchmark.py pipeline --filas 10000 --comparar resultados.json
+    python benchmark.py json --filas 1000000 --formato json jsonl
+    python benchmark.py incremental --filas 1000000 --formato json jsonl csv
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import analisis
+import charts
+from data_loader import aplicar_filtros, cargar_datos, derivar_partes_fecha, procesar_datos
+from cubo import obtener_cubo, obtener_diario
+import ingesta
+from ingesta import COLUMNAS, TIPOS_COLUMNAS, detectar_formato
+
+# Copy-on-Write, como en app.py, para medir lo mismo que ejecuta el dashboard
+pd.set_option('mode.copy_on_write', True)
+
+GRAFICOS = [
+    'crear_grafico_gasto_mensual',
+    'crear_grafico_plataformas',
+    'crear_grafico_categorias',
+    'crear_grafico_tendencias',
+    'crear_grafico_distribucion_precios',
+    'crear_grafico_top_productos',
+    'crear_grafico_heatmap_calendario'
+]
+
+INSIGHTS = [
+    'generar_insight_gasto_mensual',
+    'generar_insight_plataformas',
+    'generar_insight_categorias',
+    'generar_insight_temporal',
+    'generar_recomendaciones',
+    'generar_alertas'
+]
+
+def fechas_sinteticas(filas, dias=730, semilla=0):
+    """
+    Genera una serie de fechas aleatorias dentro de `dias` días desde 2024-01-01
+    """
+    rng = np.random.default_rng(semilla)
+    desplazamiento = rng.integers(0, dias, filas).astype('timedelta64[D]')
+    return pd.Series(np.datetime64('2024-01-01') + desplazamiento, name='fecha')
+
+def generar_compras(filas, plataformas=12, categorias=10, productos=500, dias=730,
+                    desde='2024-01-01', semilla=0):
+    """
+    Genera compras sintéticas con el esquema de compras.json (fecha como
+    texto, igual que en el archivo). Cada producto pertenece a una categoría
+    y tiene un precio base; las plataformas siguen una distribución sesgada.
+    """
+    rng = np.random.default_rng(semilla)
+
+    nombres_plataformas = np.array([f"Plataforma {i + 1}" for i in range(plataformas)], dtype=object)
+    nombres_categorias = np.array([f"Categoría {i + 1}" for i in range(categorias)], dtype=object)
+    nombres_productos = np.array([f"Producto {i + 1}" for i in range(productos)], dtype=object)
+    categoria_producto = rng.integers(0, categorias, productos)
+    precio_producto = np.round(rng.lognormal(3.5, 1.0, productos), 2)
+
+    pesos = 1 / np.arange(1, plataformas + 1)
+    producto = rng.integers(0, productos, filas)
+    desplazamiento = rng.integers(0, dias, filas).astype('timedelta64[D]')
+    fechas = np.datetime64(desde, 'D') + desplazamiento
+
+    return pd.DataFrame({
+        'fecha': np.datetime_as_string(fechas, unit='D').astype(object),
+        'plataforma': nombres_plataformas[rng.choice(plataformas, filas, p=pesos / pesos.sum())],
+        'producto': nombres_productos[producto],
+        'categoria': nombres_categorias[categoria_producto[producto]],
+        'cantidad': rng.integers(1, 4, filas),
+        'precio': np.round(precio_producto[producto] * rng.uniform(0.8, 1.2, filas), 2)
+    }, columns=COLUMNAS).astype(TIPOS_COLUMNAS)
+
+def escribir_compras(df, ruta):
+    """
+    Escribe las compras en el formato indicado por la extensión de `ruta`
+    """
+    formato = detectar_formato(ruta)
+    if formato == 'csv':
+        df.to_csv(ruta, index=False)
+    else:
+        df.to_json(ruta, orient='records', lines=formato == 'jsonl', force_ascii=False)
+    return ruta
+
+def bloques_registros(ruta, formato, filas_por_bloque=ingesta.FILAS_POR_BLOQUE):
+    """
+    Lectura JSON anterior (json estándar → lista de dicts →
+    pd.DataFrame(registros) con inferencia de tipos), usada como referencia
+    """
+    iterador = ingesta._iterar_json_array if formato == 'json' else ingesta._iterar_json_lines
+    with open(ruta, 'r', encoding='utf-8') as f:
+        for registros in iterador(f, filas_por_bloque):
+            yield ingesta._tipar_bloque(pd.DataFrame(registros))
+
+def partes_fecha_strftime(fechas):
+    """
+    Implementación anterior de procesar_datos (strftime / day_name por fila),
+    usada como referencia
+    """
+    return {
+        'mes': fechas.dt.strftime('%Y-%m'),
+        'mes_nombre': fechas.dt.strftime('%B %Y'),
+        'año': fechas.dt.year,
+        'trimestre': fechas.dt.quarter,
+        'mes_num': fechas.dt.month,
+        'semana': fechas.dt.isocalendar().week,
+        'dia_semana': fechas.dt.day_name(),
+        'dia_semana_num': fechas.dt.dayofweek
+    }
+
+def cronometrar(funcion, *args, repeticiones=1):
+    """
+    Mejor tiempo (en segundos) de `repeticiones` ejecuciones
+    """
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(*args)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+def medir_etapa(funcion, preparar=None, repeticiones=1):
+    """
+    Mejor tiempo de `repeticiones` ejecuciones de `funcion(entrada)` y pico
+    de memoria (tracemalloc, en una ejecución aparte para no sesgar el
+    tiempo). `preparar()` genera la entrada de cada ejecución fuera del
+    tiempo medido.
+    """
+    preparar = preparar or (lambda: None)
+
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        entrada = preparar()
+        inicio = time.perf_counter()
+        funcion(entrada)
+        mejor = min(mejor, time.perf_counter() - inicio)
+
+    entrada = preparar()
+    tracemalloc.start()
+    try:
+        funcion(entrada)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'tiempo_s': round(mejor, 4), 'pico_mb': round(pico / 1024 ** 2, 2)}
+
+def benchmark_pipeline(lista_filas, repeticiones=1, formato='json', directorio=None, **generador):
+    """
+    Mide carga, procesamiento, filtros, cubo, cada gráfico y cada insight
+    sobre compras sintéticas de cada tamaño. Los gráficos e insights reciben
+    un DataFrame filtrado nuevo en cada ejecución con el cubo ya calculado,
+    como en el dashboard, donde se comparte entre todos ellos.
+    """
+    resultados = []
+    for filas in lista_filas:
+        crudo = generar_compras(filas, **generador)
+
+        with tempfile.TemporaryDirectory(dir=directorio) as temporal:
+            ruta = escribir_compras(crudo, os.path.join(temporal, f"compras.{formato}"))
+            print(f"{filas:>12,} filas ({os.path.getsize(ruta) / 1024 ** 2:,.1f} MB en {formato})")
+
+            # Sin caché en disco ni límite de memoria: se mide la carga completa
+            carga = lambda _: cargar_datos(ruta, usar_cache=False, memoria_maxima_mb=None)
+            df = carga(None)
+
+            medida = medir_etapa(carga, repeticiones=repeticiones)
+            resultados.append({'filas': filas, 'etapa': 'cargar_datos', **medida})
+            print(f"    {'cargar_datos':<36} {medida['tiempo_s']:10.4f} s {medida['pico_mb']:10.1f} MB")
+
+        plataforma = df['plataforma'].value_counts().index[0]
+        rango = (df['fecha'].min().date(), df['fecha'].quantile(0.75).date())
+
+        def filtrar():
+            return aplicar_filtros(df, plataforma, 'Todas', rango)
+
+        def filtrar_con_cubo():
+            filtrado = filtrar()
+            obtener_cubo(filtrado)
+            obtener_diario(filtrado)
+            return filtrado
+
+        etapas = [
+            ('procesar_datos', procesar_datos, lambda: crudo.copy()),
+            ('aplicar_filtros', lambda _: filtrar(), None),
+            ('obtener_cubo', obtener_cubo, filtrar)
+        ]
+        etapas += [(nombre, getattr(charts, nombre), filtrar_con_cubo) for nombre in GRAFICOS]
+        etapas += [(nombre, getattr(analisis, nombre), filtrar_con_cubo) for nombre in INSIGHTS]
+
+        for etapa, funcion, preparar in etapas:
+            medida = medir_etapa(funcion, preparar, repeticiones=repeticiones)
+            resultados.append({'filas': filas, 'etapa': etapa, **medida})
+            print(f"    {etapa:<36} {medida['tiempo_s']:10.4f} s {medida['pico_mb']:10.1f} MB")
+
+        del df, crudo
+
+    return resultados
+
+def version_codigo():
+    """
+    Commit actual del repositorio (con '-dirty' si hay cambios sin guardar)
+    """
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+            check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def guardar_resultados(resultados, ruta, parametros):
+    """
+    Guarda los resultados en JSON junto con el commit y el entorno
+    """
+    documento = {
+        'commit': version_codigo(),
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'entorno': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'maquina': platform.machine()
+        },
+        'parametros': parametros,
+        'resultados': resultados
+    }
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(documento, f, indent=2, ensure_ascii=False)
+
+def comparar_resultados(resultados, ruta_anterior):
+    """
+    Compara los tiempos con los de una ejecución anterior guardada en JSON
+    (>1 significa que ahora es más lento)
+    """
+    with open(ruta_anterior, encoding='utf-8') as f:
+        anterior = json.load(f)
+    referencia = {(r['filas'], r['etapa']): r for r in anterior['resultados']}
+
+    print(f"\nComparación con {anterior.get('commit') or ruta_anterior}")
+    comparacion = []
+    for resultado in resultados:
+        previo = referencia.get((resultado['filas'], resultado['etapa']))
+        if previo is None or not previo['tiempo_s']:
+            continue
+        cociente = resultado['tiempo_s'] / previo['tiempo_s']
+        comparacion.append({**resultado, 'tiempo_anterior_s': previo['tiempo_s'], 'cociente': round(cociente, 2)})
+        print(f"{resultado['filas']:>12,} {resultado['etapa']:<36} "
+              f"{previo['tiempo_s']:10.4f} s -> {resultado['tiempo_s']:10.4f} s  x{cociente:,.2f}")
+
+    return comparacion
+
+def benchmark_parsers_json(lista_filas, formatos=('json', 'jsonl'), repeticiones=1, directorio=None):
+    """
+    Compara la lectura por bloques de JSON y JSON Lines con cada parser
+    disponible frente a la lectura anterior basada en listas de dicts
+    (tracemalloc no ve la memoria que reserva pyarrow fuera de Python)
+    """
+    resultados = []
+    for filas in lista_filas:
+        crudo = generar_compras(filas)
+
+        for formato in formatos:
+            with tempfile.TemporaryDirectory(dir=directorio) as temporal:
+                ruta = escribir_compras(crudo, os.path.join(temporal, f"compras.{formato}"))
+                print(f"{filas:>12,} filas ({os.path.getsize(ruta) / 1024 ** 2:,.1f} MB en {formato})")
+
+                lectores = {'anterior': lambda _: list(bloques_registros(ruta, formato))}
+                for parser in ingesta.PARSERS_JSON[1:]:
+                    try:
+                        ingesta.elegir_parser(formato, parser)
+                    except ValueError:
+                        continue
+                    lectores[parser] = lambda _, parser=parser: list(
+                        ingesta.iterar_bloques(ruta, formato, parser=parser)
+                    )
+
+                base = None
+                for nombre, lector in lectores.items():
+                    medida = medir_etapa(lector, repeticiones=repeticiones)
+                    base = base or medida['tiempo_s']
+                    resultados.append({'filas': filas, 'formato': formato, 'parser': nombre, **medida})
+                    print(f"    {nombre:<10} {medida['tiempo_s']:10.4f} s {medida['pico_mb']:10.1f} MB"
+                          f"  x{base / medida['tiempo_s']:,.1f}")
+
+    return resultados
+
+def benchmark_incremental(lista_filas, formatos=('json', 'jsonl', 'csv'), nuevas=1000, directorio=None):
+    """
+    Compara la carga incremental (caché en disco de la versión anterior más
+    las compras añadidas) con la recarga completa, al añadir compras con la
+    fecha de la última ya cargada y al modificar una compra existente (que
+    ambas coinciden lo comprueba tests/test_data_loader.py)
+    """
+    resultados = []
+    for filas in lista_filas:
+        crudo = generar_compras(filas)
+        crudo = crudo.iloc[np.argsort(crudo['fecha'].to_numpy(), kind='stable')].reset_index(drop=True)
+
+        # Compras añadidas el mismo día que la última del archivo
+        añadidas = generar_compras(nuevas, semilla=1).assign(fecha=crudo['fecha'].iloc[-1])
+        ampliado = pd.concat([crudo, añadidas], ignore_index=True)
+        modificado = ampliado.copy()
+        modificado.loc[0, 'precio'] = modificado.loc[0, 'precio'] + 1000
+
+        for formato in formatos:
+            with tempfile.TemporaryDirectory(dir=directorio) as temporal:
+                # La caché en disco (ruta relativa) queda dentro del directorio temporal
+                anterior = os.getcwd()
+                os.chdir(temporal)
+                try:
+                    ruta = escribir_compras(crudo, f"compras.{formato}")
+                    cargar_datos(ruta, memoria_maxima_mb=None)
+
+                    for caso, compras in [('añadidas', ampliado), ('modificada', modificado)]:
+                        escribir_compras(compras, ruta)
+                        inicio = time.perf_counter()
+                        cargar_datos(ruta, memoria_maxima_mb=None)
+                        t_incremental = time.perf_counter() - inicio
+
+                        inicio = time.perf_counter()
+                        cargar_datos(ruta, usar_cache=False, memoria_maxima_mb=None)
+                        t_completa = time.perf_counter() - inicio
+
+                        resultados.append({
+                            'filas': filas,
+                            'formato': formato,
+                            'caso': caso,
+                            'incremental_s': round(t_incremental, 4),
+                            'completa_s': round(t_completa, 4)
+                        })
+                        print(f"{filas:>12,} filas {formato:<6} {caso:<11} | incremental "
+                              f"{t_incremental:8.3f} s | completa {t_completa:8.3f} s")
+                finally:
+                    os.chdir(anterior)
+
+    return resultados
+
+def benchmark_partes_fecha(lista_filas, repeticiones=1):
+    """
+    Compara la derivación de columnas de fecha con strftime frente a la
+    aritmética entera de derivar_partes_fecha
+    """
+    resultados = []
+    for filas in lista_filas:
+        fechas = fechas_sinteticas(filas)
+        t_strftime = cronometrar(partes_fecha_strftime, fechas, repeticiones=repeticiones)
+        t_vectorizado = cronometrar(derivar_partes_fecha, fechas, repeticiones=repeticiones)
+        resultados.append({
+            'filas': filas,
+            'strftime_s': round(t_strftime, 4),
+            'vectorizado_s': round(t_vectorizado, 4),
+            'aceleracion': round(t_strftime / t_vectorizado, 1)
+        })
+        print(f"{filas:>12,} filas | strftime {t_strftime:8.3f} s | "
+              f"vectorizado {t_vectorizado:8.3f} s | x{t_strftime / t_vectorizado:,.1f}")
+
+    return resultados
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del dashboard de compras")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    fechas = subparsers.add_parser('fechas', help="Derivación de columnas de fecha")
+    fechas.add_argument('--filas', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    fechas.add_argument('--repeticiones', type=int, default=1)
+
+    parsers_json = subparsers.add_parser('json', help="Parsers JSON frente a la lectura anterior")
+    parsers_json.add_argument('--filas', type=int, nargs='+', default=[1_000_000])
+    parsers_json.add_argument('--formato', nargs='+', choices=['json', 'jsonl'], default=['json', 'jsonl'])
+    parsers_json.add_argument('--repeticiones', type=int, default=1)
+    parsers_json.add_argument('--directorio', help="Directorio para los archivos temporales")
+
+    incremental = subparsers.add_parser('incremental', help="Carga incremental frente a recarga completa")
+    incremental.add_argument('--filas', type=int, nargs='+', default=[1_000_000])
+    incremental.add_argument('--formato', nargs='+', choices=['json', 'jsonl', 'csv'],
+                             default=['json', 'jsonl', 'csv'])
+    incremental.add_argument('--nuevas', type=int, default=1000)
+    incremental.add_argument('--directorio', help="Directorio para los archivos temporales")
+
+    pipeline = subparsers.add_parser('pipeline', help="Carga, filtros, gráficos e insights")
+    pipeline.add_argument('--filas', type=int, nargs='+', default=[10_000, 1_000_000, 10_000_000])
+    pipeline.add_argument('--repeticiones', type=int, default=1)
+    pipeline.add_argument('--formato', choices=['json', 'jsonl', 'csv'], default='json')
+    pipeline.add_argument('--plataformas', type=int, default=12)
+    pipeline.add_argument('--categorias', type=int, default=10)
+    pipeline.add_argument('--productos', type=int, default=500)
+    pipeline.add_argument('--dias', type=int, default=730)
+    pipeline.add_argument('--directorio', help="Directorio para los archivos temporales")
+    pipeline.add_argument('--salida', help="Archivo JSON donde guardar los resultados")
+    pipeline.add_argument('--comparar', help="Resultados JSON anteriores con los que comparar")
+
+    args = parser.parse_args()
+
+    if args.comando == 'fechas':
+        benchmark_partes_fecha(args.filas, repeticiones=args.repeticiones)
+
+    elif args.comando == 'json':
+        benchmark_parsers_json(args.filas, formatos=args.formato, repeticiones=args.repeticiones,
+                               directorio=args.directorio)
+
+    elif args.comando == 'incremental':
+        benchmark_incremental(args.filas, formatos=args.formato, nuevas=args.nuevas,
+                              directorio=args.directorio)
+
+    elif args.comando == 'pipeline':
+        generador = {
+            'plataformas': args.plataformas,
+            'categorias': args.categorias,
+            'productos': args.productos,
+            'dias': args.dias
+        }
+        resultados = benchmark_pipeline(args.filas, repeticiones=args.repeticiones,
+                                        formato=args.formato, directorio=args.directorio,
+                                        **generador)
+        if args.salida:
+            parametros = {'filas': args.filas, 'repeticiones': args.repeticiones,
+                          'formato': args.formato, **generador}
+            guardar_resultados(resultados, args.salida, parametros)
+        if args.comparar:
+            comparar_resultados(resultados, args.comparar)
+
+if __name__ == '__main__':
+    main()
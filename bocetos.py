@@ -0,0 +1,248 @@
+"""
+Módulo para el modo aproximado de las estadísticas: bocetos combinables
+(HyperLogLog para productos distintos y un histograma logarítmico para la
+mediana y los percentiles del gasto) precalculados por plataforma ×
+categoría × mes. Para un estado de filtros se combinan los bocetos de los
+meses completos y solo se recorren las compras de los meses del borde del
+rango de fechas, así que el coste no depende del número de compras.
+"""
+import math
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from data_loader import estado_filtros, estructura_registrada, memorizar_agregado, memorizar_por_dataset
+
+# Celdas de los bocetos
+DIMENSIONES_BOCETO = ['plataforma', 'categoria', 'mes']
+
+# HyperLogLog con 2^12 registros: error estándar 1.04 / sqrt(4096) ≈ 1.6 %
+PRECISION_HLL = 12
+REGISTROS_HLL = 1 << PRECISION_HLL
+ERROR_DISTINTOS = 1.04 / math.sqrt(REGISTROS_HLL)
+
+# Histograma con intervalos logarítmicos de razón (1 + e) / (1 - e): cada
+# cuantil se devuelve con un error relativo de como mucho e
+ERROR_CUANTIL = 0.01
+RAZON_CUANTIL = (1 + ERROR_CUANTIL) / (1 - ERROR_CUANTIL)
+
+@dataclass
+class Bocetos:
+    """
+    Bocetos de un dataset: una fila de `registros` (HyperLogLog de
+    productos) y de `conteos` (histograma del gasto) por celda de `celdas`.
+    El intervalo 0 de `conteos` cuenta los importes <= 0; el intervalo i > 0
+    corresponde al índice logarítmico `indice_minimo + i - 1`.
+    """
+    celdas: pd.DataFrame
+    registros: np.ndarray
+    conteos: np.ndarray
+    indice_minimo: int
+
+def _hashes(serie):
+    """
+    Hash de 64 bits de cada valor; en columnas categóricas se calcula una
+    sola vez por categoría
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        por_categoria = pd.util.hash_array(serie.cat.categories.astype(str).to_numpy(dtype=object))
+        codigos = serie.cat.codes.to_numpy()
+        return por_categoria[codigos[codigos >= 0]], codigos >= 0
+    return pd.util.hash_array(serie.astype(str).to_numpy(dtype=object)), np.ones(len(serie), dtype=bool)
+
+def registros_hll(hashes, grupos=None, n_grupos=1):
+    """
+    Registros HyperLogLog (uno por fila de grupo) de un array de hashes
+    """
+    if grupos is None:
+        grupos = np.zeros(len(hashes), dtype=np.int64)
+
+    # Los primeros bits eligen el registro; el resto, el rango (posición del
+    # primer 1 contando desde la izquierda)
+    indices = (hashes >> np.uint64(64 - PRECISION_HLL)).astype(np.int64)
+    resto = hashes & np.uint64((1 << (64 - PRECISION_HLL)) - 1)
+
+    # Longitud en bits del resto: log2 en coma flotante, corregida cuando el
+    # redondeo a 53 bits de mantisa la adelanta en uno
+    longitud = np.zeros(len(resto), dtype=np.int64)
+    positivos = resto > 0
+    longitud[positivos] = np.floor(np.log2(resto[positivos].astype(np.float64))).astype(np.int64) + 1
+    adelantados = positivos & ((resto >> np.maximum(longitud - 1, 0).astype(np.uint64)) == 0)
+    longitud[adelantados] -= 1
+    rangos = (64 - PRECISION_HLL - longitud + 1).astype(np.uint8)
+
+    # Máximo rango por (grupo, registro)
+    maximos = pd.Series(rangos).groupby(np.asarray(grupos, dtype=np.int64) * REGISTROS_HLL + indices).max()
+    registros = np.zeros(n_grupos * REGISTROS_HLL, dtype=np.uint8)
+    registros[maximos.index.to_numpy()] = maximos.to_numpy()
+    return registros.reshape(n_grupos, REGISTROS_HLL)
+
+def estimar_distintos(registros):
+    """
+    Estimación HyperLogLog del número de valores distintos (con la
+    corrección para conjuntos pequeños)
+    """
+    m = REGISTROS_HLL
+    alfa = 0.7213 / (1 + 1.079 / m)
+    estimacion = alfa * m * m / np.sum(np.ldexp(1.0, -registros.astype(np.int64)))
+
+    vacios = int(np.count_nonzero(registros == 0))
+    if estimacion <= 2.5 * m and vacios:
+        estimacion = m * math.log(m / vacios)
+
+    return estimacion
+
+def _indices_cuantil(valores, indice_minimo, n_intervalos):
+    """
+    Intervalo del histograma de cada importe (0 para los importes <= 0)
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    indices = np.zeros(len(valores), dtype=np.int64)
+    positivos = valores > 0
+    logaritmicos = np.ceil(np.log(valores[positivos]) / math.log(RAZON_CUANTIL)).astype(np.int64)
+    indices[positivos] = np.clip(logaritmicos - indice_minimo + 1, 1, n_intervalos - 1)
+    return indices
+
+def cuantiles_boceto(conteos, probabilidades, indice_minimo):
+    """
+    Cuantiles del gasto a partir de un histograma combinado: el valor
+    representativo de cada intervalo está a un error relativo ERROR_CUANTIL
+    de cualquier importe del intervalo
+    """
+    probabilidades = np.atleast_1d(probabilidades)
+    acumulado = np.cumsum(conteos)
+    if len(acumulado) == 0 or acumulado[-1] == 0:
+        return np.full(len(probabilidades), np.nan)
+
+    intervalos = np.searchsorted(acumulado, probabilidades * (acumulado[-1] - 1), side='right')
+    indices = indice_minimo + intervalos - 1
+    valores = 2 * np.power(RAZON_CUANTIL, indices.astype(np.float64)) / (RAZON_CUANTIL + 1)
+    return np.where(intervalos == 0, 0.0, valores)
+
+def construir_bocetos(df):
+    """
+    Calcula los bocetos de cada celda plataforma × categoría × mes del
+    dataset completo (una pasada por las compras)
+    """
+    agrupado = df.groupby(DIMENSIONES_BOCETO, observed=True, sort=False)
+    celdas = agrupado.size().reset_index()[DIMENSIONES_BOCETO]
+    for columna in DIMENSIONES_BOCETO:
+        celdas[columna] = celdas[columna].astype(str)
+    grupos = agrupado.ngroup().to_numpy()
+
+    # Productos: basta con un hash por par (celda, producto) distinto
+    hashes, validos = _hashes(df['producto'])
+    pares = pd.DataFrame({'grupo': grupos[validos], 'hash': hashes}).drop_duplicates()
+    registros = registros_hll(pares['hash'].to_numpy(), pares['grupo'].to_numpy(), len(celdas))
+
+    # Gasto: histograma logarítmico entre el menor y el mayor importe positivo
+    gasto = df['total_compra'].to_numpy()
+    positivos = gasto[gasto > 0]
+    if len(positivos):
+        indice_minimo = int(math.ceil(math.log(positivos.min()) / math.log(RAZON_CUANTIL)))
+        indice_maximo = int(math.ceil(math.log(positivos.max()) / math.log(RAZON_CUANTIL)))
+    else:
+        indice_minimo = indice_maximo = 0
+    n_intervalos = indice_maximo - indice_minimo + 2
+
+    indices = _indices_cuantil(gasto, indice_minimo, n_intervalos)
+    conteos = np.bincount(grupos * n_intervalos + indices, minlength=len(celdas) * n_intervalos)
+
+    return Bocetos(celdas, registros, conteos.reshape(len(celdas), n_intervalos), indice_minimo)
+
+def obtener_bocetos(df):
+    """
+    Devuelve (y memoriza) los bocetos del dataset completo
+    """
+    return memorizar_por_dataset(df, 'bocetos', construir_bocetos)
+
+def _meses_completos(rango_fechas):
+    """
+    Primer y último mes ('AAAA-MM') enteramente dentro del rango de fechas
+    y límites [desde, hasta) de las compras de los meses del borde
+    """
+    desde = pd.Timestamp(rango_fechas[0])
+    hasta = pd.Timestamp(rango_fechas[1]) + pd.Timedelta(days=1)
+
+    inicio = desde if desde.day == 1 else (desde + pd.offsets.MonthBegin(1))
+    fin = hasta if hasta.day == 1 else (hasta - pd.offsets.MonthBegin(1))
+    if inicio >= fin:
+        return None, None, [(desde, hasta)]
+
+    ultimo = fin - pd.Timedelta(days=1)
+    bordes = [(desde, inicio), (fin, hasta)]
+    return inicio.strftime('%Y-%m'), ultimo.strftime('%Y-%m'), bordes
+
+def _filas_en(df, desde, hasta):
+    """
+    Compras con desde <= fecha < hasta (por búsqueda binaria si están ordenadas)
+    """
+    if df['fecha'].is_monotonic_increasing:
+        fechas = df['fecha'].to_numpy()
+        inicio = np.searchsorted(fechas, desde.to_datetime64(), side='left')
+        fin = np.searchsorted(fechas, hasta.to_datetime64(), side='left')
+        return df.iloc[inicio:fin]
+    return df[(df['fecha'] >= desde) & (df['fecha'] < hasta)]
+
+def _combinar_filtrados(df_filtrado, bocetos, plataforma, categoria, rango_fechas):
+    """
+    Registros HyperLogLog y histograma del estado de filtros: los de las
+    celdas de meses completos combinados, más los de las compras del borde
+    """
+    celdas = bocetos.celdas
+    mascara = np.ones(len(celdas), dtype=bool)
+    if plataforma != 'Todas':
+        mascara &= (celdas['plataforma'] == plataforma).to_numpy()
+    if categoria != 'Todas':
+        mascara &= (celdas['categoria'] == categoria).to_numpy()
+
+    bordes = []
+    if len(rango_fechas) == 2:
+        primero, ultimo, bordes = _meses_completos(rango_fechas)
+        if primero is None:
+            mascara[:] = False
+        else:
+            mascara &= ((celdas['mes'] >= primero) & (celdas['mes'] <= ultimo)).to_numpy()
+
+    registros = bocetos.registros[mascara].max(axis=0, initial=0)
+    conteos = bocetos.conteos[mascara].sum(axis=0)
+
+    # Las compras del borde ya están filtradas por plataforma y categoría
+    n_intervalos = bocetos.conteos.shape[1]
+    for desde, hasta in bordes:
+        filas = _filas_en(df_filtrado, desde, hasta)
+        if filas.empty:
+            continue
+        hashes, _ = _hashes(filas['producto'])
+        registros = np.maximum(registros, registros_hll(np.unique(hashes))[0])
+        conteos = conteos + np.bincount(
+            _indices_cuantil(filas['total_compra'].to_numpy(), bocetos.indice_minimo, n_intervalos),
+            minlength=n_intervalos
+        )
+
+    return registros, conteos
+
+def estadisticas_aproximadas(df_filtrado, probabilidades=(0.5,)):
+    """
+    Productos distintos y cuantiles del gasto de un DataFrame devuelto por
+    aplicar_filtros_con_cache, a partir de los bocetos del dataset. Devuelve
+    None si no hay bocetos calculados para su dataset (ver obtener_bocetos).
+    """
+    clave = estado_filtros(df_filtrado)
+    if clave is None:
+        return None
+
+    huella, plataforma, categoria, rango_fechas = clave
+    bocetos = estructura_registrada(huella, 'bocetos')
+    if bocetos is None:
+        return None
+
+    def calcular(df, probabilidades):
+        registros, conteos = _combinar_filtrados(df, bocetos, plataforma, categoria, rango_fechas)
+        return {
+            'productos': int(round(estimar_distintos(registros))),
+            'cuantiles': cuantiles_boceto(conteos, probabilidades, bocetos.indice_minimo),
+            'error_distintos': ERROR_DISTINTOS,
+            'error_cuantil': ERROR_CUANTIL
+        }
+
+    return memorizar_agregado(df_filtrado, 'estadisticas_aproximadas', calcular, tuple(probabilidades))
@@ -0,0 +1,398 @@
+"""
+Módulo para las cachés de datos procesados (en disco y en memoria)
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - pyarrow es opcional
+    pa = None
+    feather = None
+
+DIRECTORIO_CACHE = '.cache_compras'
+CLAVE_METADATOS = b'compras_cache'
+
+def huella_archivo(archivo, por_contenido=False):
+    """
+    Identifica una versión concreta de un archivo a partir de su ruta,
+    tamaño y fecha de modificación (o del hash de su contenido)
+    """
+    estado = os.stat(archivo)
+    partes = [os.path.abspath(archivo), str(estado.st_size)]
+
+    if por_contenido:
+        sha = hashlib.sha256()
+        with open(archivo, 'rb') as f:
+            for bloque in iter(lambda: f.read(1 << 20), b''):
+                sha.update(bloque)
+        partes.append(sha.hexdigest())
+    else:
+        partes.append(str(estado.st_mtime_ns))
+
+    return hashlib.sha1('|'.join(partes).encode('utf-8')).hexdigest()[:16]
+
+def huella_fragmentos(rutas, por_contenido=False):
+    """
+    Huella conjunta de varios archivos: cambia si cambia cualquiera de ellos
+    o el conjunto de archivos
+    """
+    partes = [huella_archivo(ruta, por_contenido) for ruta in sorted(rutas)]
+    return hashlib.sha1('|'.join(partes).encode('utf-8')).hexdigest()[:16]
+
+def _prefijo(archivo):
+    """
+    Prefijo común a todas las versiones en caché de un mismo archivo
+    """
+    return hashlib.sha1(os.path.abspath(archivo).encode('utf-8')).hexdigest()[:12]
+
+def ruta_cache(archivo, huella, directorio=DIRECTORIO_CACHE):
+    """
+    Ruta del archivo Feather que guarda una versión procesada
+    """
+    return os.path.join(directorio, f"{_prefijo(archivo)}-{huella}.feather")
+
+def cache_disponible():
+    """
+    Indica si se puede usar la caché en disco (requiere pyarrow)
+    """
+    return feather is not None
+
+def leer_cache(archivo, huella, directorio=DIRECTORIO_CACHE):
+    """
+    Devuelve el DataFrame procesado guardado para esta versión del archivo,
+    leído con memory-map, o None si no existe
+    """
+    if not cache_disponible():
+        return None
+
+    ruta = ruta_cache(archivo, huella, directorio)
+    if not os.path.exists(ruta):
+        return None
+
+    try:
+        tabla = feather.read_table(ruta, memory_map=True)
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+    # split_blocks evita consolidar columnas numéricas en un solo bloque,
+    # así se reutilizan los buffers mapeados sin copiarlos
+    df = tabla.to_pandas(split_blocks=True)
+
+    metadatos = (tabla.schema.metadata or {}).get(CLAVE_METADATOS)
+    if metadatos:
+        df.attrs.update(json.loads(metadatos))
+
+    return df
+
+def versiones_cache(archivo, directorio=DIRECTORIO_CACHE):
+    """
+    Huellas de las versiones del archivo guardadas en caché
+    """
+    if not os.path.isdir(directorio):
+        return []
+
+    prefijo = f"{_prefijo(archivo)}-"
+    return [nombre[len(prefijo):-len('.feather')] for nombre in os.listdir(directorio)
+            if nombre.startswith(prefijo) and nombre.endswith('.feather')]
+
+def guardar_cache(archivo, huella, df, directorio=DIRECTORIO_CACHE):
+    """
+    Guarda el DataFrame procesado en formato Feather sin compresión
+    (necesario para poder mapearlo en memoria) y elimina versiones
+    anteriores del mismo archivo
+    """
+    if not cache_disponible() or df.empty:
+        return None
+
+    os.makedirs(directorio, exist_ok=True)
+    ruta = ruta_cache(archivo, huella, directorio)
+
+    tabla = pa.Table.from_pandas(df, preserve_index=True)
+    metadatos = dict(tabla.schema.metadata or {})
+    metadatos[CLAVE_METADATOS] = json.dumps(df.attrs, default=str).encode('utf-8')
+    tabla = tabla.replace_schema_metadata(metadatos)
+
+    temporal = f"{ruta}.tmp-{os.getpid()}"
+    feather.write_feather(tabla, temporal, compression='uncompressed')
+    os.replace(temporal, ruta)
+
+    # Limpiar versiones obsoletas
+    prefijo = f"{_prefijo(archivo)}-"
+    for nombre in os.listdir(directorio):
+        completo = os.path.join(directorio, nombre)
+        if nombre.startswith(prefijo) and nombre.endswith('.feather') and completo != ruta:
+            try:
+                os.remove(completo)
+            except OSError:
+                pass
+
+    return ruta
+
+def tamano_objeto(valor):
+    """
+    Estimación en bytes de lo que ocupa un valor guardado en caché
+    """
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(deep=True).sum())
+    if isinstance(valor, pd.Series):
+        return int(valor.memory_usage(deep=True))
+    if isinstance(valor, (bytes, bytearray, str)):
+        return len(valor)
+    if isinstance(valor, (list, tuple)):
+        return sys.getsizeof(valor) + sum(tamano_objeto(v) for v in valor)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(tamano_objeto(v) for v in valor.values())
+    return sys.getsizeof(valor)
+
+class CacheLRU:
+    """
+    Caché en memoria con desalojo LRU, acotada por memoria (y opcionalmente
+    por número de entradas). Es segura entre hilos: Streamlit ejecuta cada
+    sesión en su propio hilo.
+    """
+    def __init__(self, memoria_maxima_mb=256, max_entradas=None, medir=tamano_objeto):
+        self.memoria_maxima = int(memoria_maxima_mb * 1024 ** 2)
+        self.max_entradas = max_entradas
+        self.medir = medir
+        self.bytes = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.RLock()
+    
+    def __len__(self):
+        return len(self._entradas)
+    
+    def __contains__(self, clave):
+        return clave in self._entradas
+    
+    def obtener(self, clave, calcular):
+        """
+        Devuelve el valor guardado para `clave` o lo calcula con `calcular()`
+        y lo guarda
+        """
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return self._entradas[clave][0]
+            self.fallos += 1
+        
+        # Se calcula fuera del lock para no bloquear a otras sesiones
+        valor = calcular()
+        self.guardar(clave, valor)
+        return valor
+    
+    def guardar(self, clave, valor):
+        """
+        Guarda un valor; si no cabe en el límite de memoria no se guarda
+        """
+        tamano = self.medir(valor)
+        if tamano > self.memoria_maxima:
+            return
+        
+        with self._lock:
+            if clave in self._entradas:
+                self.bytes -= self._entradas.pop(clave)[1]
+            self._entradas[clave] = (valor, tamano)
+            self.bytes += tamano
+            
+            while self._entradas and (
+                self.bytes > self.memoria_maxima
+                or (self.max_entradas is not None and len(self._entradas) > self.max_entradas)
+            ):
+                _, (_, liberado) = self._entradas.popitem(last=False)
+                self.bytes -= liberado
+                self.desalojos += 1
+    
+    def entradas(self, condicion=None):
+        """
+        Pares (clave, valor) guardados cuya clave cumple `condicion(clave)`
+        (todos si no se indica condición), sin contar como accesos
+        """
+        with self._lock:
+            return [(clave, valor) for clave, (valor, _) in self._entradas.items()
+                    if condicion is None or condicion(clave)]
+    
+    def invalidar(self, condicion=None):
+        """
+        Elimina las entradas cuya clave cumple `condicion(clave)`
+        (todas si no se indica condición). Devuelve cuántas se eliminaron.
+        """
+        with self._lock:
+            claves = [c for c in self._entradas if condicion is None or condicion(c)]
+            for clave in claves:
+                self.bytes -= self._entradas.pop(clave)[1]
+            return len(claves)
+    
+    def estadisticas(self):
+        """
+        Contadores de uso de la caché
+        """
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._entradas),
+                'memoria_mb': round(self.bytes / 1024 ** 2, 2),
+                'memoria_maxima_mb': round(self.memoria_maxima / 1024 ** 2, 2),
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'desalojos': self.desalojos,
+                'tasa_aciertos': round(self.aciertos / consultas, 3) if consultas else 0.0
+            }
+
+class AlmacenDatasets(CacheLRU):
+    """
+    Almacén de datasets completos compartido por todas las sesiones del
+    proceso: cada dataset se carga una sola vez (aunque lo pidan varias
+    sesiones a la vez) y todas reciben el mismo DataFrame de solo lectura.
+    Cada sesión mantiene una referencia al dataset que está usando; los
+    datasets con referencias no se desalojan y los que no tienen ninguna
+    se liberan por LRU cuando se supera `memoria_maxima_mb`.
+    """
+    def __init__(self, memoria_maxima_mb=2048, caducidad_referencia_s=1800, **kwargs):
+        super().__init__(memoria_maxima_mb=memoria_maxima_mb, **kwargs)
+        self.caducidad_referencia = caducidad_referencia_s
+        self.cargas = 0
+        self._info = {}
+        self._referencias = {}
+        self._cargando = {}
+    
+    def obtener(self, clave, calcular, sesion=None, origen=None):
+        """
+        Devuelve el dataset guardado para `clave` o lo carga con `calcular()`
+        y lo guarda; si `sesion` se indica, pasa a ser el dataset que usa.
+        Con Copy-on-Write activo se devuelve una copia superficial: comparte
+        los datos con el guardado y cualquier escritura queda en la copia. Sin
+        él, una copia completa para que nadie modifique el dataset compartido.
+        """
+        cargado = False
+        while True:
+            with self._lock:
+                if clave in self._entradas:
+                    valor, _ = self._entradas[clave]
+                    self._entradas.move_to_end(clave)
+                    self._info[clave]['accesos'] += 1
+                    self.aciertos += not cargado
+                    if sesion is not None:
+                        self._referencias[sesion] = (clave, time.monotonic())
+                    return valor.copy(deep=pd.get_option('mode.copy_on_write') is not True)
+                cerrojo = self._cargando.setdefault(clave, threading.Lock())
+            
+            # Las sesiones que piden a la vez un dataset que no está cargado
+            # esperan a la primera en lugar de cargarlo cada una (si falla,
+            # la siguiente lo vuelve a intentar)
+            try:
+                with cerrojo:
+                    if clave not in self._entradas:
+                        self.fallos += 1
+                        self.guardar(clave, calcular(), origen=origen)
+                        cargado = True
+            finally:
+                with self._lock:
+                    if self._cargando.get(clave) is cerrojo:
+                        del self._cargando[clave]
+    
+    def guardar(self, clave, valor, origen=None):
+        """
+        Guarda un dataset, aunque no quepa en el límite de memoria (lo van
+        a usar igualmente), y desaloja los que no tienen referencias
+        """
+        tamano = self.medir(valor)
+        with self._lock:
+            if clave in self._entradas:
+                self.bytes -= self._entradas.pop(clave)[1]
+            self._entradas[clave] = (valor, tamano)
+            self._info[clave] = {'origen': origen, 'creado': time.time(), 'accesos': 0}
+            self.bytes += tamano
+            self.cargas += 1
+            self._desalojar(conservar=clave)
+    
+    def _desalojar(self, conservar=None):
+        """
+        Libera los datasets sin referencias más antiguos (salvo `conservar`)
+        mientras se supere el límite de memoria o de entradas
+        """
+        self._caducar()
+        en_uso = self._en_uso()
+        for clave in [c for c in self._entradas if c not in en_uso and c != conservar]:
+            if self.bytes <= self.memoria_maxima and (
+                self.max_entradas is None or len(self._entradas) <= self.max_entradas
+            ):
+                break
+            self.bytes -= self._entradas.pop(clave)[1]
+            self._info.pop(clave, None)
+            self.desalojos += 1
+    
+    def _caducar(self):
+        """
+        Olvida las referencias que no se han renovado en `caducidad_referencia`
+        segundos (sesiones cerradas sin avisar)
+        """
+        limite = time.monotonic() - self.caducidad_referencia
+        for sesion in [s for s, (_, instante) in self._referencias.items() if instante < limite]:
+            del self._referencias[sesion]
+    
+    def _en_uso(self):
+        """
+        Número de sesiones que usan cada dataset
+        """
+        conteos = {}
+        for clave, _ in self._referencias.values():
+            conteos[clave] = conteos.get(clave, 0) + 1
+        return conteos
+    
+    def liberar(self, sesion):
+        """
+        La sesión deja de usar su dataset (al cerrarse o al pasar a un
+        origen que no se carga en memoria)
+        """
+        with self._lock:
+            if self._referencias.pop(sesion, None) is not None:
+                self._desalojar()
+    
+    def invalidar(self, condicion=None):
+        with self._lock:
+            claves = [c for c in self._entradas if condicion is None or condicion(c)]
+            for clave in claves:
+                self.bytes -= self._entradas.pop(clave)[1]
+                self._info.pop(clave, None)
+            return len(claves)
+    
+    def reporte(self):
+        """
+        Una fila por dataset guardado: origen, tamaño, memoria y sesiones que lo usan
+        """
+        with self._lock:
+            self._caducar()
+            en_uso = self._en_uso()
+            filas = []
+            for clave, (valor, tamano) in self._entradas.items():
+                info = self._info[clave]
+                filas.append({
+                    'dataset': valor.attrs.get('huella', str(clave)),
+                    'origen': info['origen'],
+                    'filas': len(valor),
+                    'columnas': len(valor.columns),
+                    'memoria_mb': round(tamano / 1024 ** 2, 2),
+                    'sesiones': en_uso.get(clave, 0),
+                    'accesos': info['accesos'],
+                    'cargado': time.strftime('%H:%M:%S', time.localtime(info['creado']))
+                })
+            return filas
+    
+    def estadisticas(self):
+        estadisticas = super().estadisticas()
+        with self._lock:
+            estadisticas['cargas'] = self.cargas
+            estadisticas['sesiones'] = len(self._referencias)
+        return estadisticas
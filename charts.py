@@ -1,12 +1,133 @@
 """
 Módulo para crear visualizaciones gráficas
 """
+import json
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
+from cache import CacheLRU
+from data_loader import estado_filtros
+from cubo import obtener_cubo, obtener_diario, resumir
 
 SIMBOLO_MONEDA = "$"
 
+# Series con más puntos se dibujan con WebGL (Scattergl) en lugar de SVG
+PUNTOS_WEBGL = 1_000
+
+# Máximo de puntos por serie enviados al navegador (se reducen con LTTB)
+MAX_PUNTOS_SERIE = 2_000
+
+# Tamaño máximo del JSON de una figura; por encima se reducen sus series
+LIMITE_PAYLOAD_BYTES = 1_000_000
+
+# Caché compartida del JSON de las figuras, con clave (gráfico, huella del
+# dataset, filtros, filas, parámetros) y desalojo LRU por tamaño
+MEMORIA_CACHE_GRAFICOS_MB = 64
+CACHE_GRAFICOS = CacheLRU(memoria_maxima_mb=MEMORIA_CACHE_GRAFICOS_MB)
+
+def grafico_en_cache(crear, df_filtrado, **parametros):
+    """
+    Devuelve la figura de `crear(df_filtrado, **parametros)` como dict de
+    Plotly (lo que espera st.plotly_chart), o None si no hay gráfico. El JSON
+    se guarda por estado de filtros, así que si solo cambia otro widget no
+    se vuelve a construir la figura.
+    """
+    filtros = estado_filtros(df_filtrado)
+    if filtros is None:
+        figura = crear(df_filtrado, **parametros)
+        return None if figura is None else json.loads(json_figura(figura))
+
+    clave = ('grafico', crear.__name__) + filtros + tuple(sorted(parametros.items()))
+
+    def calcular():
+        figura = crear(df_filtrado, **parametros)
+        return '' if figura is None else json_figura(figura)
+
+    figura_json = CACHE_GRAFICOS.obtener(clave, calcular)
+    return json.loads(figura_json) if figura_json else None
+
+def tamanos_graficos(df_filtrado):
+    """
+    Bytes del JSON de cada gráfico guardado en la caché para el estado de
+    filtros del DataFrame (vacío si no tiene estado de filtros)
+    """
+    filtros = estado_filtros(df_filtrado)
+    if filtros is None:
+        return {}
+
+    entradas = CACHE_GRAFICOS.entradas(lambda clave: clave[2:2 + len(filtros)] == filtros)
+    return {clave[1].removeprefix('crear_grafico_'): len(texto) for clave, texto in entradas if texto}
+
+def lttb(valores, puntos):
+    """
+    Índices de los `puntos` valores que conserva Largest-Triangle-Three-Buckets:
+    el primero, el último y, en cada tramo intermedio, el que forma el
+    triángulo de mayor área con el punto elegido antes y la media del tramo
+    siguiente. Mantiene picos y valles al reducir una serie larga.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    n = len(valores)
+    if puntos >= n or puntos < 3:
+        return np.arange(n)
+
+    limites = np.linspace(1, n - 1, puntos - 1).astype(np.int64)
+    elegidos = np.empty(puntos, dtype=np.int64)
+    elegidos[0], elegidos[-1] = 0, n - 1
+
+    anterior = 0
+    for tramo in range(puntos - 2):
+        inicio, fin = limites[tramo], limites[tramo + 1]
+        siguiente_fin = limites[tramo + 2] if tramo + 2 < len(limites) else n
+        siguiente_x = (fin + siguiente_fin - 1) / 2
+        siguiente_y = valores[fin:siguiente_fin].mean()
+
+        x = np.arange(inicio, fin)
+        areas = np.abs(
+            (anterior - siguiente_x) * (valores[inicio:fin] - valores[anterior])
+            - (anterior - x) * (siguiente_y - valores[anterior])
+        )
+        anterior = inicio + int(np.argmax(areas))
+        elegidos[tramo + 1] = anterior
+
+    return elegidos
+
+def _traza_serie(x, y, max_puntos=MAX_PUNTOS_SERIE, **opciones):
+    """
+    Traza de línea para una serie: reducida con LTTB si supera `max_puntos`
+    y con WebGL si sigue teniendo muchos puntos
+    """
+    indices = lttb(y, max_puntos)
+    x = np.asarray(x)[indices]
+    y = np.asarray(y)[indices]
+    traza = go.Scattergl if len(indices) > PUNTOS_WEBGL else go.Scatter
+    return traza(x=x, y=y, **opciones)
+
+def _reducir_series(fig, factor=2):
+    """
+    Reduce cada serie de líneas de la figura a 1/`factor` de sus puntos.
+    Devuelve False si no queda nada que reducir.
+    """
+    reducida = False
+    for traza in fig.data:
+        if traza.type in ('scatter', 'scattergl') and traza.y is not None and len(traza.y) > 3:
+            indices = lttb(traza.y, max(3, len(traza.y) // factor))
+            traza.x = np.asarray(traza.x)[indices]
+            traza.y = np.asarray(traza.y)[indices]
+            reducida = True
+    return reducida
+
+def json_figura(fig, limite=LIMITE_PAYLOAD_BYTES):
+    """
+    JSON de una figura tal como se envía al navegador, serializada una sola
+    vez salvo que supere `limite` bytes: entonces se reducen sus series
+    (modificando la figura) hasta que quepa o no se pueda reducir más
+    """
+    texto = fig.to_json()
+    while len(texto) > limite and _reducir_series(fig):
+        texto = fig.to_json()
+    return texto
+
 def crear_grafico_gasto_mensual(df_filtrado):
     """
     Crea gráfico de línea para gasto mensual
@@ -14,9 +135,9 @@ def crear_grafico_gasto_mensual(df_filtrado):
     if df_filtrado.empty:
         return None
     
-    # Agrupar por mes
-    gasto_mensual = df_filtrado.groupby(['mes', 'mes_nombre'])['total_compra'].sum().reset_index()
-    gasto_mensual = gasto_mensual.sort_values('mes')
+    # Agrupar por mes (desde el cubo de agregados)
+    gasto_mensual = resumir(obtener_cubo(df_filtrado), ['mes', 'mes_nombre'])['suma'].reset_index()
+    gasto_mensual = gasto_mensual.rename(columns={'suma': 'total_compra'}).sort_values('mes')
     
     # Crear gráfico
     fig = px.line(
@@ -43,12 +164,10 @@ def crear_grafico_plataformas(df_filtrado):
     if df_filtrado.empty:
         return None
     
-    compras_plataforma = df_filtrado.groupby('plataforma').agg({
-        'total_compra': 'sum',
-        'producto': 'count'
-    }).reset_index()
+    compras_plataforma = resumir(obtener_cubo(df_filtrado), 'plataforma')[['suma', 'conteo']].reset_index()
     
     compras_plataforma.columns = ['Plataforma', 'Gasto Total', 'Cantidad Compras']
+    compras_plataforma['Plataforma'] = compras_plataforma['Plataforma'].astype(str)
     
     # Crear gráfico
     fig = px.pie(
@@ -68,12 +187,10 @@ def crear_grafico_categorias(df_filtrado):
     if df_filtrado.empty:
         return None
     
-    compras_categoria = df_filtrado.groupby('categoria').agg({
-        'total_compra': 'sum',
-        'producto': 'count'
-    }).reset_index()
+    compras_categoria = resumir(obtener_cubo(df_filtrado), 'categoria')[['suma', 'conteo']].reset_index()
     
     compras_categoria.columns = ['Categoría', 'Gasto Total', 'Cantidad']
+    compras_categoria['Categoría'] = compras_categoria['Categoría'].astype(str)
     compras_categoria = compras_categoria.sort_values('Gasto Total', ascending=False)
     
     # Crear gráfico
@@ -108,22 +225,20 @@ def crear_grafico_tendencias(df_filtrado):
     if df_filtrado.empty:
         return None
     
-    # Agrupar por semana
-    df_filtrado['semana'] = df_filtrado['fecha'].dt.strftime('%Y-%U')
-    tendencias = df_filtrado.groupby('semana').agg({
-        'total_compra': 'sum',
-        'producto': 'count'
-    }).reset_index()
+    # Agrupar por semana (a partir de los totales diarios)
+    diario = obtener_diario(df_filtrado)
+    semana = diario.index.strftime('%Y-%U').rename('semana')
+    tendencias = diario.groupby(semana)[['suma', 'conteo']].sum().reset_index()
     
     tendencias.columns = ['Semana', 'Gasto Total', 'Cantidad Compras']
     
     # Crear gráfico
     fig = go.Figure()
     
-    # Línea de gasto
-    fig.add_trace(go.Scatter(
-        x=tendencias['Semana'],
-        y=tendencias['Gasto Total'],
+    # Línea de gasto (reducida con LTTB y en WebGL si es muy larga)
+    fig.add_trace(_traza_serie(
+        tendencias['Semana'],
+        tendencias['Gasto Total'],
         mode='lines+markers',
         name='Gasto Total',
         line=dict(color='#FF6B6B', width=3),
@@ -146,17 +261,25 @@ def crear_grafico_distribucion_precios(df_filtrado):
     if df_filtrado.empty:
         return None
     
-    fig = px.histogram(
-        df_filtrado,
-        x='precio',
-        nbins=20,
-        title="📊 Distribución de Precios",
-        labels={'precio': f'Precio ({SIMBOLO_MONEDA})', 'count': 'Cantidad de Productos'}
-    )
+    # Histograma calculado aquí: al navegador solo van los 20 intervalos,
+    # no un precio por compra
+    precios = df_filtrado['precio'].to_numpy()
+    conteos, bordes = np.histogram(precios[~np.isnan(precios)], bins=20)
+    
+    fig = go.Figure(go.Bar(
+        x=(bordes[:-1] + bordes[1:]) / 2,
+        y=conteos,
+        width=np.diff(bordes),
+        customdata=np.column_stack([bordes[:-1], bordes[1:]]),
+        hovertemplate=(f'Precio: {SIMBOLO_MONEDA}%{{customdata[0]:,.2f}} - '
+                       f'{SIMBOLO_MONEDA}%{{customdata[1]:,.2f}}<br>Cantidad: %{{y}}<extra></extra>')
+    ))
     
     fig.update_layout(
+        title="📊 Distribución de Precios",
         xaxis_title=f"Precio ({SIMBOLO_MONEDA})",
-        yaxis_title="Cantidad de Productos"
+        yaxis_title="Cantidad de Productos",
+        bargap=0
     )
     
     return fig
@@ -171,6 +294,9 @@ def crear_grafico_top_productos(df_filtrado, top_n=10):
     # Obtener los productos más caros
     top_productos = df_filtrado.nlargest(top_n, 'total_compra')[['producto', 'total_compra', 'plataforma']]
     
+    # Etiquetas como texto para que Plotly no agrupe por categorías sin datos
+    top_productos = top_productos.astype({'producto': str, 'plataforma': str})
+    
     # Acortar nombres de productos si son muy largos
     top_productos['producto_corto'] = top_productos['producto'].apply(
         lambda x: x[:30] + '...' if len(x) > 30 else x
@@ -208,23 +334,12 @@ def crear_grafico_heatmap_calendario(df_filtrado):
     if df_filtrado.empty:
         return None
     
-    # Preparar datos para heatmap
-    df_filtrado['dia_semana_num'] = df_filtrado['fecha'].dt.dayofweek
-    df_filtrado['dia_semana_nombre'] = df_filtrado['fecha'].dt.day_name()
-    df_filtrado['mes_num'] = df_filtrado['fecha'].dt.month
-    
-    heatmap_data = df_filtrado.pivot_table(
-        values='total_compra',
-        index='dia_semana_nombre',
-        columns='mes_num',
-        aggfunc='sum',
-        fill_value=0
-    )
+    # Preparar datos para heatmap (desde el cubo de agregados)
+    heatmap_data = resumir(obtener_cubo(df_filtrado), ['dia_semana_num', 'mes_num'])['suma'].unstack(fill_value=0)
     
-    # Ordenar días de la semana
-    dias_ordenados = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    # Ordenar días de la semana (0 = lunes)
     dias_espanol = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-    heatmap_data = heatmap_data.reindex(dias_ordenados)
+    heatmap_data = heatmap_data.reindex(range(7))
     
     fig = go.Figure(data=go.Heatmap(
         z=heatmap_data.values,
@@ -0,0 +1,7 @@
+"""
+Configuración de pytest: los módulos del dashboard se importan desde la
+raíz del repositorio y, como en app.py, con Copy-on-Write activo
+"""
+import pandas as pd
+
+pd.set_option('mode.copy_on_write', True)
@@ -0,0 +1,214 @@
+"""
+Módulo para el cubo de agregados compartido por métricas, gráficos e insights
+"""
+import weakref
+import numpy as np
+import pandas as pd
+from data_loader import REAGREGACION, estado_filtros, memorizar_agregado, rollup_filtrado
+from bocetos import estadisticas_aproximadas
+
+# Dimensiones del cubo; mes_nombre y mes_num dependen de mes y se incluyen
+# para no tener que derivarlos al consultar
+DIMENSIONES = ['plataforma', 'categoria', 'mes', 'mes_nombre', 'mes_num', 'dia_semana_num']
+
+# Agregados de DataFrames que no pasan por la caché de filtros
+_AGREGADOS = {}
+
+def construir_cubo(df):
+    """
+    Agrega las compras en una sola pasada por plataforma × categoría × mes ×
+    día de la semana, con conteo, suma, suma de cuadrados, mínimo y máximo del
+    gasto, suma de precios y primera/última fecha de cada celda
+    """
+    datos = df[DIMENSIONES + ['total_compra', 'precio', 'fecha']].assign(
+        total_cuadrado=df['total_compra'] ** 2
+    )
+
+    cubo = datos.groupby(DIMENSIONES, observed=True, sort=False).agg(
+        conteo=('total_compra', 'size'),
+        suma=('total_compra', 'sum'),
+        suma_cuadrados=('total_cuadrado', 'sum'),
+        minimo=('total_compra', 'min'),
+        maximo=('total_compra', 'max'),
+        suma_precio=('precio', 'sum'),
+        fecha_min=('fecha', 'min'),
+        fecha_max=('fecha', 'max')
+    )
+
+    return cubo.reset_index()
+
+def cubo_desde_rollup(rollup):
+    """
+    Construye el cubo reagrupando las filas del rollup diario en lugar de
+    las compras individuales
+    """
+    return rollup.groupby(DIMENSIONES, observed=True, sort=False).agg(**REAGREGACION).reset_index()
+
+def _construir_cubo_filtrado(df):
+    """
+    Cubo de un DataFrame filtrado: desde el rollup diario si los filtros se
+    pueden expresar sobre él, o recorriendo las compras si no
+    """
+    diario = rollup_filtrado(df)
+    if diario is not None:
+        return cubo_desde_rollup(diario)
+    return construir_cubo(df)
+
+def _construir_diario(df):
+    """
+    Conteo y gasto por día, desde el rollup diario o desde las compras
+    """
+    diario = rollup_filtrado(df)
+    if diario is not None:
+        return diario.groupby('dia')[['conteo', 'suma']].sum()
+
+    dia = df['fecha'].dt.normalize().rename('dia')
+    return df.groupby(dia)['total_compra'].agg(conteo='size', suma='sum')
+
+def _memorizar(df, nombre, calcular):
+    """
+    Calcula un agregado una sola vez: por estado de filtros si el DataFrame
+    viene de aplicar_filtros_con_cache, o por objeto si no
+    """
+    if estado_filtros(df) is not None:
+        return memorizar_agregado(df, nombre, calcular)
+
+    clave = (id(df), nombre)
+    entrada = _AGREGADOS.get(clave)
+    if entrada is not None and entrada[0]() is df:
+        return entrada[1]
+
+    valor = calcular(df)
+    _AGREGADOS[clave] = (weakref.ref(df, lambda _: _AGREGADOS.pop(clave, None)), valor)
+    return valor
+
+def obtener_cubo(df):
+    """
+    Devuelve el cubo de agregados del DataFrame, calculado una sola vez
+    """
+    return _memorizar(df, 'cubo', _construir_cubo_filtrado)
+
+def obtener_diario(df):
+    """
+    Devuelve el conteo y gasto por día del DataFrame, calculado una sola vez
+    """
+    return _memorizar(df, 'diario', _construir_diario)
+
+def resumir(cubo, por):
+    """
+    Reagrupa el cubo por las dimensiones `por` y deriva promedio y
+    desviación estándar (muestral, como pandas) de las sumas
+    """
+    if isinstance(por, str):
+        por = [por]
+
+    resumen = cubo.groupby(por, observed=True).agg(**REAGREGACION)
+
+    return _derivar(resumen)
+
+def totales(cubo):
+    """
+    Totales del cubo completo como una Serie con los mismos campos que resumir
+    """
+    total = pd.DataFrame({
+        'conteo': [cubo['conteo'].sum()],
+        'suma': [cubo['suma'].sum()],
+        'suma_cuadrados': [cubo['suma_cuadrados'].sum()],
+        'minimo': [cubo['minimo'].min()],
+        'maximo': [cubo['maximo'].max()],
+        'suma_precio': [cubo['suma_precio'].sum()],
+        'fecha_min': [cubo['fecha_min'].min()],
+        'fecha_max': [cubo['fecha_max'].max()]
+    })
+
+    return _derivar(total).iloc[0]
+
+def _derivar(resumen):
+    """
+    Añade promedio, precio promedio y desviación estándar
+    """
+    n = resumen['conteo']
+    resumen['promedio'] = resumen['suma'] / n
+    resumen['precio_promedio'] = resumen['suma_precio'] / n
+
+    # Varianza muestral a partir de las sumas (se recorta el error de redondeo)
+    varianza = (resumen['suma_cuadrados'] - resumen['suma'] ** 2 / n) / (n - 1)
+    resumen['desviacion'] = np.sqrt(varianza.clip(lower=0)).where(n > 1)
+
+    return resumen
+
+def valores_distintos(cubo, columna):
+    """
+    Número de valores distintos de una dimensión con compras
+    """
+    return cubo[columna].nunique()
+
+def cuantiles(valores, probabilidades):
+    """
+    Cuantiles exactos (interpolación lineal, como pandas) de un array, sin
+    contar los NaN. numpy los obtiene por selección (np.partition) en tiempo
+    lineal, sin ordenar el array; las estimaciones más baratas son las del
+    modo aproximado (ver bocetos.py).
+    """
+    valores = np.asarray(valores)
+    probabilidades = np.atleast_1d(probabilidades)
+    if len(valores) == 0:
+        return np.full(len(probabilidades), np.nan)
+    return np.nanquantile(valores, probabilidades)
+
+def _contar_distintos(serie):
+    """
+    Valores distintos de una columna; si es categórica, contando sus códigos
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        codigos = serie.cat.codes.to_numpy()
+        presentes = np.bincount(codigos[codigos >= 0], minlength=len(serie.cat.categories))
+        return int(np.count_nonzero(presentes))
+    return serie.nunique()
+
+def _calcular_estadisticas(df):
+    """
+    Totales del cubo más la mediana del gasto y los productos distintos
+    """
+    cubo = obtener_cubo(df)
+    estadisticas = totales(cubo)
+
+    estadisticas['mediana'] = cuantiles(df['total_compra'].to_numpy(), 0.5)[0]
+    estadisticas['plataformas'] = valores_distintos(cubo, 'plataforma')
+    estadisticas['categorias'] = valores_distintos(cubo, 'categoria')
+    estadisticas['productos'] = _contar_distintos(df['producto'])
+
+    return estadisticas
+
+def _calcular_estadisticas_aproximadas(df):
+    """
+    Como _calcular_estadisticas, pero con la mediana y los productos
+    distintos estimados con los bocetos del dataset (exactas si no hay)
+    """
+    aproximadas = estadisticas_aproximadas(df)
+    if aproximadas is None:
+        return _calcular_estadisticas(df)
+
+    cubo = obtener_cubo(df)
+    estadisticas = totales(cubo)
+    estadisticas['mediana'] = aproximadas['cuantiles'][0]
+    estadisticas['plataformas'] = valores_distintos(cubo, 'plataforma')
+    estadisticas['categorias'] = valores_distintos(cubo, 'categoria')
+    estadisticas['productos'] = aproximadas['productos']
+    estadisticas['error_cuantil'] = aproximadas['error_cuantil']
+    estadisticas['error_distintos'] = aproximadas['error_distintos']
+
+    return estadisticas
+
+def obtener_estadisticas(df, aproximado=False):
+    """
+    Estadísticas generales del gasto (conteo, suma, promedio, mediana,
+    desviación, mínimo, máximo, fechas y valores distintos), calculadas una
+    sola vez: todo sale del cubo salvo la mediana y los productos distintos,
+    que necesitan una pasada cada uno por las compras. Con `aproximado` esas
+    dos se estiman con los bocetos de bocetos.py (si se calcularon para el
+    dataset) e incluyen su error relativo en 'error_cuantil' y 'error_distintos'.
+    """
+    if aproximado:
+        return _memorizar(df, 'estadisticas_aproximadas', _calcular_estadisticas_aproximadas)
+    return _memorizar(df, 'estadisticas', _calcular_estadisticas)
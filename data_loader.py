@@ -1,37 +1,246 @@
 """
 Módulo para carga y procesamiento de datos
 """
+import calendar
+import hashlib
+import io
+import os
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+from functools import partial
+import numpy as np
 import pandas as pd
-import json
-import streamlit as st
+from ingesta import (FILAS_POR_BLOQUE, MEMORIA_MAXIMA_MB, PARSER_JSON, detectar_formato, es_multiple,
+                     filtrar_fragmentos, fusionar_ordenados, leer_fragmentos, leer_incremento,
+                     leer_por_bloques, listar_fragmentos, unificar_categorias)
+from almacen import leer_particionado, leer_resumen
+from cache import (AlmacenDatasets, CacheLRU, guardar_cache, huella_archivo, huella_fragmentos,
+                   leer_cache, versiones_cache)
 
-@st.cache_data
-def cargar_datos(archivo='compras.json'):
+# Esquema compacto del DataFrame procesado: textos de baja cardinalidad
+# como categorías y componentes de fecha como enteros pequeños
+ESQUEMA = {
+    'plataforma': 'category',
+    'categoria': 'category',
+    'producto': 'category',
+    'mes': 'category',
+    'mes_nombre': 'category',
+    'dia_semana': 'category',
+    'año': 'int16',
+    'trimestre': 'int8',
+    'mes_num': 'int8',
+    'semana': 'int8',
+    'dia_semana_num': 'int8'
+}
+
+DIAS_SEMANA = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Columnas que pasan a float32 con la opción `float32=True`
+COLUMNAS_FLOAT32 = ['precio', 'total_compra']
+
+# Agregaciones para reagrupar celdas ya agregadas (rollup diario, cubo)
+REAGREGACION = {
+    'conteo': ('conteo', 'sum'),
+    'suma': ('suma', 'sum'),
+    'suma_cuadrados': ('suma_cuadrados', 'sum'),
+    'minimo': ('minimo', 'min'),
+    'maximo': ('maximo', 'max'),
+    'suma_precio': ('suma_precio', 'sum'),
+    'fecha_min': ('fecha_min', 'min'),
+    'fecha_max': ('fecha_max', 'max')
+}
+
+class ErrorCargaDatos(Exception):
+    """
+    No se pudo cargar o procesar un archivo de compras
+    """
+
+# Caché compartida de DataFrames filtrados y de los agregados calculados
+# sobre ellos, con clave (huella del dataset, filtros)
+MEMORIA_CACHE_FILTROS_MB = 256
+CACHE_FILTROS = CacheLRU(memoria_maxima_mb=MEMORIA_CACHE_FILTROS_MB)
+
+# Datasets completos (archivos del servidor y archivos subidos) compartidos
+# por todas las sesiones del proceso: una sola copia en memoria de cada uno
+MEMORIA_DATASETS_MB = 2048
+CADUCIDAD_SESION_S = 1800
+DATASETS = AlmacenDatasets(
+    memoria_maxima_mb=MEMORIA_DATASETS_MB,
+    caducidad_referencia_s=CADUCIDAD_SESION_S
+)
+
+# Directorio del que el dashboard puede leer archivos, directorios y
+# patrones de fragmentos (por defecto, el directorio de trabajo)
+DIRECTORIO_DATOS = os.path.realpath(os.environ.get('COMPRAS_DIRECTORIO_DATOS', '.'))
+
+# Hash del contenido por identificador de subida, para no recalcularlo en cada ejecución
+_HUELLAS_SUBIDOS = OrderedDict()
+MAX_HUELLAS_SUBIDOS = 256
+_LOCK_HUELLAS = threading.Lock()
+
+def resolver_origen(origen, raiz=None):
     """
-    Carga datos desde un archivo JSON o CSV
+    Ruta absoluta de un origen de datos (archivo, directorio o patrón glob)
+    relativo a `raiz` (DIRECTORIO_DATOS si no se indica). Lanza ValueError
+    si el origen, con sus enlaces simbólicos resueltos, queda fuera de ella.
+    """
+    raiz = os.path.realpath(raiz or DIRECTORIO_DATOS)
+    partes = os.path.normpath(os.path.join(raiz, origen)).split(os.sep)
+    
+    # La parte sin comodines se resuelve; tras normpath el resto ya no tiene '..'
+    fijas = 0
+    while fijas < len(partes) and not any(c in partes[fijas] for c in '*?['):
+        fijas += 1
+    base = os.path.realpath(os.sep.join(partes[:fijas]) or os.sep)
+    
+    if os.path.commonpath([raiz, base]) != raiz:
+        raise ValueError(f"'{origen}' está fuera del directorio de datos del dashboard")
+    return os.path.join(base, *partes[fijas:])
+
+def huella_origen(archivo, rango_fechas=None):
+    """
+    Huella de un archivo o, si `archivo` es un directorio o patrón glob, de
+    los fragmentos que se cargarían para `rango_fechas`
+    """
+    if es_multiple(archivo):
+        return huella_fragmentos(filtrar_fragmentos(listar_fragmentos(archivo), rango_fechas))
+    return huella_archivo(archivo)
+
+def cargar_datos(archivo='compras.json', huella=None, usar_cache=True, float32=False,
+                 filas_por_bloque=FILAS_POR_BLOQUE, memoria_maxima_mb=MEMORIA_MAXIMA_MB,
+                 parser=PARSER_JSON, rango_fechas=None, procesos=None):
+    """
+    Carga datos desde un archivo JSON, JSON Lines o CSV leyendo por bloques
+    (`parser` elige el decodificador JSON, ver ingesta.elegir_parser).
+    `archivo` también puede ser un directorio o patrón glob de fragmentos:
+    se procesan en paralelo en `procesos` procesos y se fusionan ya
+    ordenados; con `rango_fechas` solo se leen los fragmentos cuyo nombre
+    indica fechas dentro del rango.
+    `huella` identifica la versión del archivo (ver huella_origen):
+    forma parte de la clave de la caché en disco (y de la de Streamlit en
+    app.py), de modo que un archivo modificado nunca se sirve desde una
+    versión anterior. Lanza ErrorCargaDatos si el archivo no se puede leer.
     """
     try:
-        if archivo.endswith('.json'):
-            with open(archivo, 'r', encoding='utf-8') as f:
-                datos = json.load(f)
-            df = pd.DataFrame(datos)
-        else:
-            df = pd.read_csv(archivo)
+        multiple = es_multiple(archivo)
+        if multiple:
+            todas = listar_fragmentos(archivo)
+            if not todas:
+                raise FileNotFoundError(archivo)
+            rutas = filtrar_fragmentos(todas, rango_fechas)
         
-        # Procesamiento de datos
-        df = procesar_datos(df)
+        if huella is None:
+            huella = huella_fragmentos(rutas) if multiple else huella_archivo(archivo)
+        if float32:
+            huella = f"{huella}-f32"
+
+        # Caché columnar persistente entre reinicios
+        if usar_cache:
+            df = leer_cache(archivo, huella)
+            if df is not None:
+                return df
+            
+            # Si hay una versión anterior en caché, se añaden solo las compras nuevas
+            for huella_anterior in ([] if multiple else versiones_cache(archivo)):
+                if huella_anterior.endswith('-f32') != float32:
+                    continue
+                anterior = leer_cache(archivo, huella_anterior)
+                if anterior is None:
+                    continue
+                df = cargar_incremental(archivo, anterior, huella, float32=float32,
+                                        filas_por_bloque=filas_por_bloque)
+                if df is not None:
+                    guardar_cache(archivo, huella, df)
+                    return df
+
+        # Procesamiento de datos por bloques (o por fragmentos en paralelo)
+        procesar = partial(procesar_datos, float32=float32)
+        if multiple:
+            df = leer_fragmentos(rutas, procesar, procesos=procesos, filas_por_bloque=filas_por_bloque,
+                                 memoria_maxima_mb=memoria_maxima_mb, parser=parser)
+            df.attrs.setdefault('ingesta', {})['fragmentos_omitidos'] = len(todas) - len(rutas)
+        else:
+            df = leer_por_bloques(
+                archivo,
+                detectar_formato(archivo),
+                procesar,
+                filas_por_bloque=filas_por_bloque,
+                memoria_maxima_mb=memoria_maxima_mb,
+                parser=parser
+            )
+        df.attrs['huella'] = huella
+
+        if usar_cache:
+            guardar_cache(archivo, huella, df)
+
         return df
         
-    except FileNotFoundError:
-        st.error(f"Archivo {archivo} no encontrado.")
-        return pd.DataFrame()
+    except FileNotFoundError as e:
+        raise ErrorCargaDatos(f"Archivo {archivo} no encontrado.") from e
     except Exception as e:
-        st.error(f"Error al cargar datos: {str(e)}")
-        return pd.DataFrame()
+        raise ErrorCargaDatos(f"Error al cargar datos: {str(e)}") from e
 
-def procesar_datos(df):
+def cargar_incremental(archivo, df_anterior, huella=None, float32=False,
+                       filas_por_bloque=FILAS_POR_BLOQUE):
     """
-    Realiza transformaciones comunes en los datos
+    Añade a un DataFrame ya procesado solo las compras agregadas al final
+    del archivo desde que se cargó (ver ingesta.leer_incremento): procesa el
+    incremento, lo intercala en el orden por fecha y actualiza el rollup
+    diario sin recalcularlo. Devuelve None si el archivo cambió de otra
+    forma y hay que recargarlo completo.
+    """
+    estado = df_anterior.attrs.get('ingesta', {})
+    resultado = leer_incremento(archivo, estado, filas_por_bloque)
+    if resultado is None:
+        return None
+    bloques, nuevo_estado = resultado
+    
+    if huella is None:
+        huella = huella_archivo(archivo)
+        if float32:
+            huella = f"{huella}-f32"
+    huella_anterior = df_anterior.attrs.get('huella')
+    
+    # Procesar solo el incremento, con índice a continuación del existente
+    filas = estado.get('filas', len(df_anterior))
+    nuevas = []
+    for bloque in bloques:
+        bloque.index = pd.RangeIndex(filas, filas + len(bloque))
+        filas += len(bloque)
+        nuevas.append(procesar_datos(bloque, float32=float32))
+    
+    if nuevas:
+        delta = pd.concat(unificar_categorias(nuevas)) if len(nuevas) > 1 else nuevas[0]
+        delta = delta.sort_values('fecha', kind='stable')
+        df = fusionar_ordenados(df_anterior, delta)
+    else:
+        delta = None
+        df = df_anterior.copy(deep=False)
+    
+    df.attrs = {
+        **df_anterior.attrs,
+        'huella': huella,
+        'ingesta': {
+            **estado,
+            **nuevo_estado,
+            'filas': filas
+        }
+    }
+    
+    # Rollup diario: se combina el del dataset anterior con el del incremento
+    rollup = estructura_registrada(huella_anterior, 'rollup')
+    if rollup is not None:
+        if delta is not None:
+            rollup = combinar_rollups(rollup, calcular_rollup_diario(delta))
+        memorizar_por_dataset(df, 'rollup', lambda _: rollup)
+    
+    return df
+
+def procesar_datos(df, float32=False):
+    """
+    Realiza transformaciones comunes en los datos y aplica el esquema compacto
     """
     # Convertir fecha
     df['fecha'] = pd.to_datetime(df['fecha'])
@@ -40,41 +249,462 @@ def procesar_datos(df):
     df['total_compra'] = df['cantidad'] * df['precio']
     
     # Extraer componentes de fecha
-    df['mes'] = df['fecha'].dt.strftime('%Y-%m')
-    df['mes_nombre'] = df['fecha'].dt.strftime('%B %Y')
-    df['año'] = df['fecha'].dt.year
-    df['trimestre'] = df['fecha'].dt.quarter
-    df['semana'] = df['fecha'].dt.isocalendar().week
-    df['dia_semana'] = df['fecha'].dt.day_name()
+    for columna, valores in derivar_partes_fecha(df['fecha']).items():
+        df[columna] = valores
+    
+    # Tipos compactos
+    df = aplicar_esquema(df, float32=float32)
     
     # Ordenar por fecha
-    df = df.sort_values('fecha')
+    df = df.sort_values('fecha', kind='stable')
     
     return df
 
-def aplicar_filtros(df, plataforma_seleccionada, categoria_seleccionada, rango_fechas):
+def _categorica(claves, etiquetar):
     """
-    Aplica filtros al DataFrame
+    Construye una columna categórica a partir de claves enteras de rango
+    pequeño: solo se genera una etiqueta por clave presente y las categorías
+    quedan ordenadas alfabéticamente, igual que astype('category')
     """
-    df_filtrado = df.copy()
+    if len(claves) == 0:
+        return pd.Categorical.from_codes(np.array([], dtype=np.int8), [])
+    
+    base = claves.min()
+    relativo = claves - base
+    presentes = np.flatnonzero(np.bincount(relativo))
+    etiquetas = np.array([etiquetar(base + k) for k in presentes], dtype=object)
+    
+    # Posición de cada clave presente dentro de las etiquetas ordenadas
+    orden = np.argsort(etiquetas, kind='stable')
+    posicion = np.full(relativo.max() + 1, -1, dtype=np.int64)
+    posicion[presentes[orden]] = np.arange(len(presentes))
+    
+    return pd.Categorical.from_codes(posicion[relativo], etiquetas[orden])
+
+def _etiqueta_mes(meses):
+    """'YYYY-MM' de un número de meses desde 1970-01"""
+    return f"{meses // 12 + 1970:04d}-{meses % 12 + 1:02d}"
+
+def _etiqueta_mes_nombre(meses):
+    """'%B %Y' de un número de meses desde 1970-01 (calendar respeta el locale como strftime)"""
+    return f"{calendar.month_name[meses % 12 + 1]} {meses // 12 + 1970}"
+
+def derivar_partes_fecha(fechas):
+    """
+    Calcula las columnas derivadas de la fecha con aritmética entera sobre
+    el buffer datetime64, sin formatear texto fila por fila: las etiquetas
+    solo se generan una vez por mes o día de la semana presente
+    """
+    if fechas.isna().any():
+        raise ValueError("Hay compras sin fecha o con fechas inválidas")
+    
+    valores = fechas.to_numpy(dtype='datetime64[ns]')
+    dias = valores.astype('datetime64[D]').astype(np.int64)
+    meses = valores.astype('datetime64[M]').astype(np.int64)
+    
+    mes_num = meses % 12 + 1
+    dia_semana_num = (dias + 3) % 7  # 1970-01-01 fue jueves
+    
+    # Semana ISO: la del jueves de esa semana dentro de su propio año
+    jueves = dias - dia_semana_num + 3
+    inicio_año = jueves.astype('datetime64[D]').astype('datetime64[Y]').astype('datetime64[D]')
+    semana = (jueves - inicio_año.astype(np.int64)) // 7 + 1
+    
+    return {
+        'mes': _categorica(meses, _etiqueta_mes),
+        'mes_nombre': _categorica(meses, _etiqueta_mes_nombre),
+        'año': (meses // 12 + 1970).astype(np.int16),
+        'trimestre': ((mes_num - 1) // 3 + 1).astype(np.int8),
+        'mes_num': mes_num.astype(np.int8),
+        'semana': semana.astype(np.int8),
+        'dia_semana': _categorica(dia_semana_num, DIAS_SEMANA.__getitem__),
+        'dia_semana_num': dia_semana_num.astype(np.int8)
+    }
+
+def aplicar_esquema(df, float32=False):
+    """
+    Convierte las columnas al esquema compacto (ver ESQUEMA)
+    """
+    tipos = {col: tipo for col, tipo in ESQUEMA.items()
+             if col in df.columns and df[col].dtype != tipo}
+    if float32:
+        tipos.update({col: 'float32' for col in COLUMNAS_FLOAT32
+                      if col in df.columns and df[col].dtype != 'float32'})
+    return df.astype(tipos) if tipos else df
+
+def _memoria_sin_esquema(serie):
+    """
+    Bytes que ocuparía la columna con los tipos por defecto de pandas
+    (textos como object, enteros como int64, decimales como float64)
+    """
+    n = len(serie)
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Puntero por fila más el tamaño de cada texto repetido
+        conteos = np.bincount(serie.cat.codes.to_numpy() + 1,
+                              minlength=len(serie.cat.categories) + 1)[1:]
+        tamanos = np.array([sys.getsizeof(c) for c in serie.cat.categories], dtype=np.int64)
+        return n * 8 + int((conteos * tamanos).sum())
+    if serie.dtype.kind in 'iuf':
+        return n * 8
+    return int(serie.memory_usage(deep=True, index=False))
+
+def reporte_memoria(df):
+    """
+    Compara, columna por columna, la memoria del esquema compacto con la
+    de los tipos por defecto
+    """
+    filas = []
+    for col in df.columns:
+        compacto = int(df[col].memory_usage(deep=True, index=False))
+        original = _memoria_sin_esquema(df[col])
+        filas.append({
+            'columna': col,
+            'tipo': str(df[col].dtype),
+            'original_mb': original / 1024 ** 2,
+            'compacto_mb': compacto / 1024 ** 2,
+            'ahorro_mb': (original - compacto) / 1024 ** 2,
+            'ahorro_pct': (1 - compacto / original) * 100 if original else 0.0
+        })
+    
+    return pd.DataFrame(filas).set_index('columna').round(3)
+
+class IndiceFiltros:
+    """
+    Estructuras precalculadas para filtrar sin recorrer ni copiar el DataFrame:
+    la columna de fechas ordenada (búsqueda binaria), los códigos enteros de
+    plataforma/categoría y, por cada valor pedido, las posiciones de sus filas
+    """
+    COLUMNAS = ('plataforma', 'categoria')
+    
+    def __init__(self, df):
+        self.filas = len(df)
+        
+        # procesar_datos deja las fechas ordenadas; si no lo están se filtra con máscara
+        self.fechas = df['fecha'].to_numpy() if df['fecha'].is_monotonic_increasing else None
+        
+        self.codigos = {}
+        self.valores = {}
+        for columna in self.COLUMNAS:
+            serie = df[columna]
+            if isinstance(serie.dtype, pd.CategoricalDtype):
+                codigos, valores = serie.cat.codes.to_numpy(), serie.cat.categories
+            else:
+                codigos, valores = pd.factorize(serie)
+            self.codigos[columna] = codigos
+            self.valores[columna] = pd.Index(valores)
+        
+        self._posiciones = {}
+    
+    def codigo(self, columna, valor):
+        """Código entero de `valor` en la columna (-1 si no aparece)"""
+        valores = self.valores[columna]
+        return valores.get_loc(valor) if valor in valores else -1
+    
+    def posiciones(self, columna, valor):
+        """Posiciones (ordenadas) de las filas con columna == valor"""
+        clave = (columna, valor)
+        if clave not in self._posiciones:
+            codigo = self.codigo(columna, valor)
+            # -1 es también el código de los nulos: un valor ausente no coincide con nada
+            if codigo == -1:
+                self._posiciones[clave] = np.empty(0, dtype=np.intp)
+            else:
+                self._posiciones[clave] = np.flatnonzero(self.codigos[columna] == codigo)
+        return self._posiciones[clave]
+    
+    def rango(self, desde, hasta):
+        """Posiciones [inicio, fin) de las compras con desde <= fecha < hasta"""
+        inicio = np.searchsorted(self.fechas, desde.to_datetime64(), side='left')
+        fin = np.searchsorted(self.fechas, hasta.to_datetime64(), side='left')
+        return int(inicio), int(fin)
+
+# Estructuras derivadas de cada dataset completo (índice de filtros, rollup
+# diario, bocetos): se identifican por su huella o, si no tienen, por el
+# objeto. El límite cuenta datasets, no estructuras, y el lock protege el
+# diccionario frente a las sesiones que lo usan a la vez desde sus hilos.
+_ESTRUCTURAS_DATASET = OrderedDict()
+MAX_DATASETS_ESTRUCTURAS = 8
+_LOCK_ESTRUCTURAS = threading.Lock()
+
+def memorizar_por_dataset(df, nombre, calcular):
+    """
+    Calcula `calcular(df)` una sola vez por dataset y la guarda junto a él
+    """
+    huella = df.attrs.get('huella')
+    clave = huella if huella is not None else id(df)
+    
+    def vigente(entrada):
+        referencia, filas, _ = entrada
+        return filas == len(df) and (referencia is None or referencia() is df)
+    
+    with _LOCK_ESTRUCTURAS:
+        entrada = _ESTRUCTURAS_DATASET.get(clave)
+        if entrada is not None and vigente(entrada) and nombre in entrada[2]:
+            _ESTRUCTURAS_DATASET.move_to_end(clave)
+            return entrada[2][nombre]
+    
+    # Se calcula fuera del lock para no bloquear a otras sesiones
+    valor = calcular(df)
+    
+    with _LOCK_ESTRUCTURAS:
+        entrada = _ESTRUCTURAS_DATASET.get(clave)
+        if entrada is None or not vigente(entrada):
+            entrada = (weakref.ref(df) if huella is None else None, len(df), {})
+            _ESTRUCTURAS_DATASET[clave] = entrada
+        entrada[2][nombre] = valor
+        _ESTRUCTURAS_DATASET.move_to_end(clave)
+        while len(_ESTRUCTURAS_DATASET) > MAX_DATASETS_ESTRUCTURAS:
+            _ESTRUCTURAS_DATASET.popitem(last=False)
+    
+    return valor
+
+def estructura_registrada(huella, nombre):
+    """
+    Devuelve una estructura ya calculada para el dataset con esa huella, o None
+    """
+    with _LOCK_ESTRUCTURAS:
+        entrada = _ESTRUCTURAS_DATASET.get(huella)
+        return entrada[2].get(nombre) if entrada is not None else None
+
+def obtener_indice_filtros(df):
+    """
+    Devuelve (y memoriza) el IndiceFiltros del DataFrame
+    """
+    return memorizar_por_dataset(df, 'indice_filtros', IndiceFiltros)
+
+def calcular_rollup_diario(df):
+    """
+    Resume las compras por día × plataforma × categoría con conteo, suma,
+    suma de cuadrados, mínimo y máximo del gasto, suma de precios y
+    primera/última fecha, más las columnas de fecha derivadas del día
+    """
+    datos = df[['plataforma', 'categoria', 'total_compra', 'precio', 'fecha']].assign(
+        dia=df['fecha'].dt.normalize(),
+        total_cuadrado=df['total_compra'] ** 2
+    )
+    
+    rollup = datos.groupby(['dia', 'plataforma', 'categoria'], observed=True).agg(
+        conteo=('total_compra', 'size'),
+        suma=('total_compra', 'sum'),
+        suma_cuadrados=('total_cuadrado', 'sum'),
+        minimo=('total_compra', 'min'),
+        maximo=('total_compra', 'max'),
+        suma_precio=('precio', 'sum'),
+        fecha_min=('fecha', 'min'),
+        fecha_max=('fecha', 'max')
+    ).reset_index()
+    
+    # Columnas de fecha calculadas sobre los días (muchas menos filas que compras)
+    partes = derivar_partes_fecha(rollup['dia'])
+    for columna in ['mes', 'mes_nombre', 'mes_num', 'dia_semana_num']:
+        rollup[columna] = partes[columna]
+    
+    return rollup
+
+def combinar_rollups(rollup, rollup_nuevo):
+    """
+    Incorpora al rollup diario el de un lote de compras nuevas: solo se
+    reagregan los días que aparecen en ambos
+    """
+    rollup, rollup_nuevo = unificar_categorias([rollup, rollup_nuevo])
+    
+    solapados = rollup['dia'].isin(rollup_nuevo['dia'].unique()).to_numpy()
+    if not solapados.any():
+        combinado = rollup_nuevo
+    else:
+        combinado = pd.concat([rollup[solapados], rollup_nuevo]).groupby(
+            ['dia', 'plataforma', 'categoria'], observed=True
+        ).agg(**REAGREGACION).reset_index()
+        partes = derivar_partes_fecha(combinado['dia'])
+        for columna in ['mes', 'mes_nombre', 'mes_num', 'dia_semana_num']:
+            combinado[columna] = partes[columna]
+    
+    bloques = unificar_categorias([rollup[~solapados], combinado[rollup.columns]])
+    return pd.concat(bloques, ignore_index=True).sort_values('dia', kind='stable', ignore_index=True)
+
+def obtener_rollup(df):
+    """
+    Devuelve (y memoriza) el rollup diario del dataset completo
+    """
+    return memorizar_por_dataset(df, 'rollup', calcular_rollup_diario)
+
+def filtrar_rollup(rollup, plataforma_seleccionada, categoria_seleccionada, rango_fechas):
+    """
+    Aplica al rollup diario los mismos filtros que aplicar_filtros a las compras
+    """
+    mascara = np.ones(len(rollup), dtype=bool)
     
-    # Filtrar por rango de fechas
     if len(rango_fechas) == 2:
-        df_filtrado = df_filtrado[
-            (df_filtrado['fecha'].dt.date >= rango_fechas[0]) & 
-            (df_filtrado['fecha'].dt.date <= rango_fechas[1])
-        ]
+        dias = rollup['dia']
+        mascara &= (dias >= pd.Timestamp(rango_fechas[0])).to_numpy()
+        mascara &= (dias <= pd.Timestamp(rango_fechas[1])).to_numpy()
     
-    # Filtrar por plataforma
     if plataforma_seleccionada != 'Todas':
-        df_filtrado = df_filtrado[df_filtrado['plataforma'] == plataforma_seleccionada]
+        mascara &= (rollup['plataforma'] == plataforma_seleccionada).to_numpy()
     
-    # Filtrar por categoría
     if categoria_seleccionada != 'Todas':
-        df_filtrado = df_filtrado[df_filtrado['categoria'] == categoria_seleccionada]
+        mascara &= (rollup['categoria'] == categoria_seleccionada).to_numpy()
     
+    return rollup[mascara]
+
+# DataFrames filtrados guardados en CACHE_FILTROS, por objeto: solo el objeto
+# exacto tiene el estado de filtros de su clave (una sub-selección suya no,
+# aunque pandas le copie los attrs). La entrada se borra al liberarse el objeto.
+_ESTADOS_FILTROS = {}
+
+def _registrar_filtrado(df_filtrado, clave):
+    """
+    Asocia el estado de filtros `clave` al DataFrame filtrado
+    """
+    identificador = id(df_filtrado)
+    referencia = weakref.ref(df_filtrado, lambda _: _ESTADOS_FILTROS.pop(identificador, None))
+    _ESTADOS_FILTROS[identificador] = (referencia, clave)
     return df_filtrado
 
+def estado_filtros(df_filtrado):
+    """
+    Clave del estado de filtros si el DataFrame es exactamente el devuelto
+    por aplicar_filtros_con_cache (o aplicar_filtros_particionado), o None
+    """
+    entrada = _ESTADOS_FILTROS.get(id(df_filtrado))
+    if entrada is None or entrada[0]() is not df_filtrado:
+        return None
+    return entrada[1]
+
+def rollup_filtrado(df_filtrado):
+    """
+    Rollup diario correspondiente a un DataFrame devuelto por
+    aplicar_filtros_con_cache, o None si los filtros no se pueden
+    expresar sobre el rollup (DataFrame sin huella o sin rollup calculado)
+    """
+    clave = estado_filtros(df_filtrado)
+    if clave is None:
+        return None
+    
+    huella, plataforma, categoria, rango_fechas = clave
+    rollup = estructura_registrada(huella, 'rollup')
+    if rollup is None:
+        return None
+    
+    return memorizar_agregado(
+        df_filtrado, 'rollup',
+        lambda _: filtrar_rollup(rollup, plataforma, categoria, rango_fechas)
+    )
+
+def aplicar_filtros(df, plataforma_seleccionada, categoria_seleccionada, rango_fechas):
+    """
+    Aplica filtros al DataFrame sin copiarlo entero: el rango de fechas se
+    resuelve con búsqueda binaria sobre la columna ordenada y los filtros por
+    plataforma/categoría con las posiciones precalculadas del índice.
+    Devuelve una vista (iloc) o una selección posicional (take).
+    """
+    indice = obtener_indice_filtros(df)
+    inicio, fin = 0, len(df)
+    posiciones = None
+    
+    # Filtrar por rango de fechas (incluye el día final completo)
+    if len(rango_fechas) == 2:
+        desde = pd.Timestamp(rango_fechas[0])
+        hasta = pd.Timestamp(rango_fechas[1]) + pd.Timedelta(days=1)
+        if indice.fechas is not None:
+            inicio, fin = indice.rango(desde, hasta)
+        else:
+            fechas = df['fecha'].to_numpy()
+            posiciones = np.flatnonzero((fechas >= desde.to_datetime64()) & (fechas < hasta.to_datetime64()))
+    
+    # Filtrar por plataforma y categoría
+    filtros = (('plataforma', plataforma_seleccionada), ('categoria', categoria_seleccionada))
+    for columna, valor in filtros:
+        if valor == 'Todas':
+            continue
+        if posiciones is None:
+            filas = indice.posiciones(columna, valor)
+            posiciones = filas[np.searchsorted(filas, inicio):np.searchsorted(filas, fin)]
+        else:
+            codigo = indice.codigo(columna, valor)
+            if codigo == -1:
+                posiciones = posiciones[:0]
+            else:
+                posiciones = posiciones[indice.codigos[columna][posiciones] == codigo]
+    
+    if posiciones is None:
+        return df.iloc[inicio:fin]
+    
+    return df.take(posiciones)
+
+def clave_filtros(df, plataforma_seleccionada, categoria_seleccionada, rango_fechas):
+    """
+    Clave de caché de un estado de filtros, o None si el dataset no tiene huella
+    """
+    huella = df.attrs.get('huella')
+    if huella is None:
+        return None
+    
+    return (huella, plataforma_seleccionada, categoria_seleccionada,
+            tuple(str(fecha) for fecha in rango_fechas))
+
+def aplicar_filtros_con_cache(df, plataforma_seleccionada, categoria_seleccionada, rango_fechas):
+    """
+    Igual que aplicar_filtros, pero reutiliza el resultado si ya se calculó
+    para el mismo dataset y los mismos filtros
+    """
+    clave = clave_filtros(df, plataforma_seleccionada, categoria_seleccionada, rango_fechas)
+    if clave is None:
+        return aplicar_filtros(df, plataforma_seleccionada, categoria_seleccionada, rango_fechas)
+    
+    # El rollup diario se mantiene junto al dataset para responder a los agregados
+    obtener_rollup(df)
+    
+    def calcular():
+        df_filtrado = aplicar_filtros(df, plataforma_seleccionada, categoria_seleccionada, rango_fechas)
+        return _registrar_filtrado(df_filtrado, clave)
+    
+    return CACHE_FILTROS.obtener(('filtrado',) + clave, calcular)
+
+def aplicar_filtros_particionado(directorio, plataforma_seleccionada, categoria_seleccionada,
+                                 rango_fechas):
+    """
+    Igual que aplicar_filtros_con_cache, pero sobre un almacén particionado
+    (ver almacen.py): los filtros se aplican en la lectura y solo se lee de
+    disco el trozo que los cumple, sin cargar el dataset completo
+    """
+    resumen = leer_resumen(directorio)
+    clave = (resumen['huella'], plataforma_seleccionada, categoria_seleccionada,
+             tuple(str(fecha) for fecha in rango_fechas))
+    
+    def calcular():
+        df_filtrado = leer_particionado(directorio, plataforma_seleccionada,
+                                        categoria_seleccionada, rango_fechas)
+        df_filtrado = aplicar_esquema(df_filtrado[resumen['columnas']])
+        df_filtrado.attrs = {'huella': resumen['huella']}
+        return _registrar_filtrado(df_filtrado, clave)
+    
+    return CACHE_FILTROS.obtener(('filtrado',) + clave, calcular)
+
+def opciones_filtros_particionado(directorio):
+    """
+    Opciones de los filtros y rango de fechas de un almacén particionado,
+    leídos de su resumen (sin recorrer los datos)
+    """
+    resumen = leer_resumen(directorio)
+    plataformas = ['Todas'] + resumen['plataformas']
+    categorias = ['Todas'] + resumen['categorias']
+    rango = (pd.Timestamp(resumen['fecha_min']).date(), pd.Timestamp(resumen['fecha_max']).date())
+    
+    return plataformas, categorias, rango
+
+def memorizar_agregado(df_filtrado, nombre, calcular, *args):
+    """
+    Calcula `calcular(df_filtrado, *args)` una sola vez por estado de filtros.
+    Si el DataFrame no viene de aplicar_filtros_con_cache se calcula sin caché.
+    """
+    clave = estado_filtros(df_filtrado)
+    if clave is None:
+        return calcular(df_filtrado, *args)
+    
+    clave = ('agregado', nombre) + clave + args
+    return CACHE_FILTROS.obtener(clave, lambda: calcular(df_filtrado, *args))
+
 def obtener_opciones_filtros(df):
     """
     Obtiene opciones únicas para los filtros
@@ -84,23 +714,83 @@ def obtener_opciones_filtros(df):
     
     return plataformas, categorias
 
-def cargar_datos_subidos(archivo_subido):
+def huella_subido(archivo_subido):
+    """
+    Huella del contenido de un archivo subido. Si la subida tiene
+    identificador (file_id de Streamlit) el hash se calcula una sola vez.
     """
-    Carga datos desde un archivo subido
+    identificador = getattr(archivo_subido, 'file_id', None)
+    if identificador is not None:
+        clave = (identificador, getattr(archivo_subido, 'size', None))
+        with _LOCK_HUELLAS:
+            if clave in _HUELLAS_SUBIDOS:
+                _HUELLAS_SUBIDOS.move_to_end(clave)
+                return _HUELLAS_SUBIDOS[clave]
+    
+    huella = f"subido-{hashlib.sha1(archivo_subido.getvalue()).hexdigest()[:16]}"
+    
+    if identificador is not None:
+        with _LOCK_HUELLAS:
+            _HUELLAS_SUBIDOS[clave] = huella
+            while len(_HUELLAS_SUBIDOS) > MAX_HUELLAS_SUBIDOS:
+                _HUELLAS_SUBIDOS.popitem(last=False)
+    
+    return huella
+
+def _procesar_subido(archivo_subido, huella, formato):
+    """
+    Lee y procesa el contenido de un archivo subido
+    """
+    df = leer_por_bloques(io.BytesIO(archivo_subido.getvalue()), formato, procesar_datos)
+    
+    # La huella del contenido distingue cada archivo subido en las cachés
+    df.attrs['huella'] = huella
+    return df
+
+def cargar_datos_compartidos(archivo, huella, rango_fechas=None, sesion=None):
+    """
+    cargar_datos a través de DATASETS: todas las sesiones que piden la misma
+    versión de un origen (y rango de fragmentos) comparten un único DataFrame.
+    `sesion` identifica al usuario para la cuenta de referencias.
+    """
+    clave = ('origen', archivo, huella, tuple(rango_fechas) if rango_fechas is not None else None)
+    return DATASETS.obtener(
+        clave,
+        lambda: cargar_datos(archivo, huella, rango_fechas=rango_fechas),
+        sesion=sesion,
+        origen=archivo
+    )
+
+def cargar_datos_subidos(archivo_subido, sesion=None):
+    """
+    Carga datos desde un archivo subido. El resultado se guarda en
+    DATASETS por hash del contenido, así que volver a ejecutar el script
+    (p. ej. al cambiar un filtro) no vuelve a leerlo ni procesarlo, y las
+    sesiones que suben el mismo archivo lo comparten.
+    `sesion` identifica al usuario para la cuenta de referencias.
+    Lanza ErrorCargaDatos si no se puede leer.
     """
     try:
-        if archivo_subido.name.endswith('.json'):
-            datos = json.load(archivo_subido)
-            df = pd.DataFrame(datos)
-        else:
-            df = pd.read_csv(archivo_subido)
-        
-        df = procesar_datos(df)
-        return df
+        huella = huella_subido(archivo_subido)
+        formato = detectar_formato(archivo_subido.name)
+        return DATASETS.obtener(
+            ('subido', huella, formato),
+            lambda: _procesar_subido(archivo_subido, huella, formato),
+            sesion=sesion,
+            origen=archivo_subido.name
+        )
         
     except Exception as e:
-        st.error(f"Error al cargar archivo: {str(e)}")
-        return pd.DataFrame()
+        raise ErrorCargaDatos(f"Error al cargar archivo: {str(e)}") from e
+
+class TestigoSesion:
+    """
+    Guardado en el estado de una sesión, libera su referencia en DATASETS
+    cuando Streamlit descarta la sesión (y con ella este objeto)
+    """
+    def __init__(self, sesion):
+        self.sesion = sesion
+        weakref.finalize(self, DATASETS.liberar, sesion)
 
 def obtener_resumen_estadistico(df):
     """
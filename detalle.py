@@ -0,0 +1,84 @@
+"""
+Módulo para la tabla de detalle de compras: ordenación, búsqueda por
+producto y paginación sin copiar ni formatear el DataFrame completo
+"""
+import numpy as np
+import pandas as pd
+from data_loader import memorizar_agregado
+
+# Columnas de la tabla con su título
+TITULOS_DETALLE = {
+    'fecha': 'Fecha',
+    'plataforma': 'Plataforma',
+    'producto': 'Producto',
+    'categoria': 'Categoría',
+    'cantidad': 'Cantidad',
+    'precio': 'Precio Unitario',
+    'total_compra': 'Total Compra'
+}
+
+FILAS_POR_PAGINA = [25, 50, 100, 250]
+
+def _clave_orden(serie):
+    """
+    Valores numéricos que ordenan la columna como pandas: fechas por su
+    valor entero y categorías por el orden alfabético de sus etiquetas
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        rangos = np.empty(len(serie.cat.categories), dtype=np.int64)
+        rangos[np.argsort(serie.cat.categories.astype(str), kind='stable')] = np.arange(len(rangos))
+        codigos = serie.cat.codes.to_numpy()
+        # Los nulos (código -1) van al final
+        return np.where(codigos >= 0, rangos[codigos], len(rangos))
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.to_numpy().view(np.int64)
+    return serie.to_numpy()
+
+def _calcular_orden(df, columna, ascendente):
+    """
+    Posiciones de las filas ordenadas por `columna`; los empates conservan
+    el orden por fecha
+    """
+    if columna == 'fecha' and ascendente and df['fecha'].is_monotonic_increasing:
+        return np.arange(len(df))
+
+    clave = _clave_orden(df[columna])
+    return np.argsort(clave if ascendente else -clave, kind='stable')
+
+def _calcular_busqueda(df, texto):
+    """
+    Máscara de las filas cuyo producto contiene `texto` (sin distinguir
+    mayúsculas). Con producto categórico se compara cada producto una sola vez.
+    """
+    producto = df['producto']
+    if isinstance(producto.dtype, pd.CategoricalDtype):
+        coincide = producto.cat.categories.astype(str).str.contains(texto, case=False, regex=False)
+        codigos = producto.cat.codes.to_numpy()
+        return np.where(codigos >= 0, np.asarray(coincide)[codigos], False)
+
+    return producto.astype(str).str.contains(texto, case=False, regex=False).to_numpy()
+
+def _calcular_posiciones(df, columna, ascendente, texto):
+    """
+    Posiciones de las filas visibles en la tabla, en el orden pedido
+    """
+    orden = memorizar_agregado(df, 'detalle_orden', _calcular_orden, columna, ascendente)
+    if not texto:
+        return orden
+
+    mascara = memorizar_agregado(df, 'detalle_busqueda', _calcular_busqueda, texto)
+    return orden[mascara[orden]]
+
+def pagina_detalle(df, pagina=1, filas_por_pagina=FILAS_POR_PAGINA[0], columna='fecha',
+                   ascendente=True, texto=''):
+    """
+    Devuelve (filas de la página, total de filas que cumplen la búsqueda).
+    La ordenación y la búsqueda se memorizan por estado de filtros, así que
+    cambiar de página solo selecciona `filas_por_pagina` filas.
+    """
+    texto = texto.strip()
+    posiciones = memorizar_agregado(df, 'detalle_posiciones', _calcular_posiciones,
+                                    columna, ascendente, texto)
+
+    inicio = (pagina - 1) * filas_por_pagina
+    return df.iloc[posiciones[inicio:inicio + filas_por_pagina]], len(posiciones)
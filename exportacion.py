@@ -0,0 +1,127 @@
+"""
+Módulo para exportar las compras filtradas a CSV, CSV comprimido o Parquet.
+Los archivos se escriben por bloques en disco solo cuando se piden y se
+reutilizan mientras no cambien el dataset ni los filtros.
+"""
+import gzip
+import hashlib
+import os
+import uuid
+from cache import DIRECTORIO_CACHE
+from data_loader import estado_filtros
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow es opcional
+    pa = None
+    pq = None
+
+DIRECTORIO_EXPORTACIONES = os.path.join(DIRECTORIO_CACHE, 'exportaciones')
+
+# Filas que se convierten y escriben a la vez
+FILAS_POR_BLOQUE_EXPORTACION = 50_000
+
+# Exportaciones guardadas como máximo; se eliminan las más antiguas
+MAX_EXPORTACIONES = 16
+
+# Formato: (descripción, extensión, tipo MIME)
+FORMATOS_EXPORTACION = {
+    'csv': ("CSV", '.csv', 'text/csv'),
+    'csv.gz': ("CSV comprimido (gzip)", '.csv.gz', 'application/gzip'),
+    'parquet': ("Parquet", '.parquet', 'application/vnd.apache.parquet')
+}
+
+def formatos_disponibles():
+    """
+    Formatos de exportación utilizables (Parquet requiere pyarrow)
+    """
+    return [formato for formato in FORMATOS_EXPORTACION if formato != 'parquet' or pq is not None]
+
+def ruta_exportacion(df_filtrado, formato, directorio=DIRECTORIO_EXPORTACIONES):
+    """
+    Ruta del archivo exportado para el estado de filtros del DataFrame, o
+    None si no tiene estado de filtros (no se puede reutilizar)
+    """
+    clave = estado_filtros(df_filtrado)
+    if clave is None:
+        return None
+
+    nombre = hashlib.sha1(repr(clave).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(directorio, f"{nombre}{FORMATOS_EXPORTACION[formato][1]}")
+
+def _bloques(df, filas_por_bloque):
+    """
+    Trozos consecutivos del DataFrame (vistas, sin copiarlo entero); uno
+    vacío si no tiene filas, para escribir al menos las columnas
+    """
+    for inicio in range(0, max(len(df), 1), filas_por_bloque):
+        yield df.iloc[inicio:inicio + filas_por_bloque]
+
+def _escribir_csv(df, ruta, comprimir, filas_por_bloque):
+    """
+    CSV (opcionalmente gzip) escrito bloque a bloque, igual que df.to_csv(index=False)
+    """
+    abrir = gzip.open if comprimir else open
+    with abrir(ruta, 'wt', encoding='utf-8', newline='') as f:
+        for numero, bloque in enumerate(_bloques(df, filas_por_bloque)):
+            bloque.to_csv(f, index=False, header=numero == 0)
+
+def _escribir_parquet(df, ruta, filas_por_bloque):
+    """
+    Parquet con un grupo de filas por bloque
+    """
+    escritor = None
+    try:
+        for bloque in _bloques(df, filas_por_bloque):
+            tabla = pa.Table.from_pandas(bloque, preserve_index=False)
+            if escritor is None:
+                escritor = pq.ParquetWriter(ruta, tabla.schema, compression='zstd')
+            escritor.write_table(tabla)
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+def _limpiar(directorio, conservar):
+    """
+    Elimina las exportaciones más antiguas por encima de MAX_EXPORTACIONES
+    """
+    archivos = [os.path.join(directorio, nombre) for nombre in os.listdir(directorio)
+                if '.tmp-' not in nombre]
+    archivos.sort(key=os.path.getmtime, reverse=True)
+    for ruta in archivos[MAX_EXPORTACIONES:]:
+        if ruta != conservar:
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+
+def exportar(df_filtrado, formato='csv', directorio=DIRECTORIO_EXPORTACIONES,
+             filas_por_bloque=FILAS_POR_BLOQUE_EXPORTACION):
+    """
+    Escribe las compras filtradas en `formato` y devuelve la ruta del archivo.
+    Si ya se exportó el mismo estado de filtros se devuelve el archivo existente.
+    """
+    if formato not in formatos_disponibles():
+        raise ValueError(f"Formato de exportación no disponible: {formato}")
+
+    ruta = ruta_exportacion(df_filtrado, formato, directorio)
+    if ruta is not None and os.path.exists(ruta):
+        return ruta
+    if ruta is None:
+        ruta = os.path.join(directorio, f"{uuid.uuid4().hex[:16]}{FORMATOS_EXPORTACION[formato][1]}")
+
+    os.makedirs(directorio, exist_ok=True)
+    temporal = f"{ruta}.tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    try:
+        if formato == 'parquet':
+            _escribir_parquet(df_filtrado, temporal, filas_por_bloque)
+        else:
+            _escribir_csv(df_filtrado, temporal, formato == 'csv.gz', filas_por_bloque)
+        os.replace(temporal, ruta)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+    _limpiar(directorio, ruta)
+    return ruta
@@ -0,0 +1,703 @@
+"""
+Módulo para lectura por bloques de archivos de compras
+"""
+import calendar
+import glob
+import hashlib
+import io
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.json as pa_json
+except ImportError:  # pragma: no cover - pyarrow es opcional
+    pa = None
+    pa_json = None
+
+COLUMNAS = ['fecha', 'plataforma', 'producto', 'categoria', 'cantidad', 'precio']
+
+# Tipos explícitos de entrada (la fecha se convierte en procesar_datos)
+TIPOS_COLUMNAS = {
+    'fecha': 'object',
+    'plataforma': 'object',
+    'producto': 'object',
+    'categoria': 'object',
+    'cantidad': 'int64',
+    'precio': 'float64'
+}
+
+FILAS_POR_BLOQUE = 100_000
+MEMORIA_MAXIMA_MB = 2048
+TAMANO_LECTURA = 1 << 20
+
+EXTENSIONES = ('.json', '.jsonl', '.ndjson', '.csv')
+
+# Fecha en el nombre de un fragmento: AAAA-MM o AAAA-MM-DD (también con '_')
+PATRON_FECHA_FRAGMENTO = re.compile(r'(?<!\d)(\d{4})[-_](\d{2})(?:[-_](\d{2}))?(?!\d)')
+
+# Parsers JSON disponibles; 'auto' elige el más rápido instalado
+PARSERS_JSON = ['auto', 'stdlib', 'orjson', 'pyarrow']
+PARSER_JSON = 'auto'
+
+# orjson no lee por partes: un arreglo JSON más grande que esto se recorre
+# por bloques con el parser estándar para no cargarlo entero en memoria
+LIMITE_ORJSON_MB = 256
+
+# pyarrow tampoco lee JSON Lines por partes (construye la tabla Arrow
+# completa): por encima de este tamaño se leen por líneas en bloques
+LIMITE_PYARROW_MB = 256
+
+def detectar_formato(nombre):
+    """
+    Deduce el formato del archivo a partir de su extensión
+    """
+    nombre = nombre.lower()
+    if nombre.endswith('.jsonl') or nombre.endswith('.ndjson'):
+        return 'jsonl'
+    if nombre.endswith('.json'):
+        return 'json'
+    return 'csv'
+
+def _iterar_json_array(f, filas_por_bloque):
+    """
+    Recorre un arreglo JSON de objetos sin cargarlo entero en memoria
+    """
+    decodificador = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    fin_archivo = False
+    dentro = False
+    bloque = []
+
+    while True:
+        # Saltar espacios y separadores
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+
+        if pos >= len(buffer):
+            if fin_archivo:
+                raise ValueError("JSON incompleto: falta ']' de cierre")
+            leido = f.read(TAMANO_LECTURA)
+            fin_archivo = len(leido) == 0
+            buffer = leido
+            pos = 0
+            continue
+
+        if not dentro:
+            if buffer[pos] != '[':
+                raise ValueError("Se esperaba un arreglo JSON de compras")
+            dentro = True
+            pos += 1
+            continue
+
+        if buffer[pos] == ']':
+            break
+
+        try:
+            registro, fin = decodificador.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # El objeto puede estar partido entre dos lecturas
+            if fin_archivo:
+                raise
+            leido = f.read(TAMANO_LECTURA)
+            fin_archivo = len(leido) == 0
+            buffer = buffer[pos:] + leido
+            pos = 0
+            continue
+
+        if not isinstance(registro, dict):
+            raise ValueError("Cada compra del arreglo JSON debe ser un objeto")
+
+        bloque.append(registro)
+        pos = fin
+
+        if len(bloque) >= filas_por_bloque:
+            yield bloque
+            bloque = []
+            buffer = buffer[pos:]
+            pos = 0
+
+    if bloque:
+        yield bloque
+
+def _iterar_json_lines(f, filas_por_bloque):
+    """
+    Recorre un archivo JSON Lines (un objeto por línea)
+    """
+    bloque = []
+    for linea in f:
+        linea = linea.strip()
+        if not linea:
+            continue
+        bloque.append(json.loads(linea))
+        if len(bloque) >= filas_por_bloque:
+            yield bloque
+            bloque = []
+
+    if bloque:
+        yield bloque
+
+def _a_enteros(valores, columna):
+    """
+    Convierte los valores de una columna entera a int64 como read_csv: un
+    decimal no entero o un valor nulo lanza ValueError en lugar de truncarse
+    """
+    array = np.asarray(valores)
+    if array.dtype.kind in 'iub':
+        return array.astype('int64')
+
+    try:
+        decimales = array.astype('float64')
+    except (TypeError, ValueError):
+        raise ValueError(f"La columna {columna} debe contener números enteros") from None
+    if not np.isfinite(decimales).all() or (decimales != np.trunc(decimales)).any():
+        raise ValueError(f"La columna {columna} debe contener números enteros")
+    return decimales.astype('int64')
+
+def _columnas_de_registros(registros):
+    """
+    Construye directamente las columnas conocidas (con su tipo) a partir de
+    una lista de compras decodificadas, sin pasar por pd.DataFrame(registros)
+    """
+    try:
+        columnas = {col: [registro[col] for registro in registros] for col in COLUMNAS}
+    except KeyError:
+        faltantes = [col for col in COLUMNAS if any(col not in registro for registro in registros)]
+        raise ValueError(f"Faltan columnas requeridas: {', '.join(faltantes)}") from None
+    except TypeError:
+        raise ValueError("Cada compra debe ser un objeto JSON") from None
+
+    return pd.DataFrame({
+        col: _a_enteros(valores, col) if TIPOS_COLUMNAS[col] == 'int64'
+        else np.array(valores, dtype=TIPOS_COLUMNAS[col])
+        for col, valores in columnas.items()
+    })
+
+def _iterar_json_lines_orjson(f, filas_por_bloque):
+    """
+    Recorre un archivo JSON Lines en binario decodificando cada línea con orjson
+    """
+    bloque = []
+    for linea in f:
+        if not linea.strip():
+            continue
+        bloque.append(orjson.loads(linea))
+        if len(bloque) >= filas_por_bloque:
+            yield bloque
+            bloque = []
+
+    if bloque:
+        yield bloque
+
+def _iterar_json_array_orjson(f, filas_por_bloque):
+    """
+    Decodifica un arreglo JSON entero con orjson y lo reparte en bloques
+    """
+    registros = orjson.loads(f.read())
+    if not isinstance(registros, list):
+        raise ValueError("Se esperaba un arreglo JSON de compras")
+
+    for inicio in range(0, len(registros), filas_por_bloque):
+        yield registros[inicio:inicio + filas_por_bloque]
+
+def _bloques_pyarrow(origen, filas_por_bloque):
+    """
+    Lee JSON Lines con el lector columnar de pyarrow, con el esquema de las
+    columnas conocidas, y lo devuelve en bloques de DataFrame
+    """
+    esquema = pa.schema([
+        (col, pa.int64() if tipo == 'int64' else pa.float64() if tipo == 'float64' else pa.string())
+        for col, tipo in TIPOS_COLUMNAS.items()
+    ])
+    tabla = pa_json.read_json(
+        origen,
+        parse_options=pa_json.ParseOptions(explicit_schema=esquema, unexpected_field_behavior='ignore')
+    )
+
+    faltantes = [col for col in COLUMNAS if tabla.num_rows and tabla[col].null_count == tabla.num_rows]
+    if faltantes:
+        raise ValueError(f"Faltan columnas requeridas: {', '.join(faltantes)}")
+
+    for lote in tabla.to_batches(max_chunksize=filas_por_bloque):
+        yield lote.to_pandas()
+
+def elegir_parser(formato, parser=PARSER_JSON, tamano=None):
+    """
+    Resuelve qué parser usar para un archivo JSON o JSON Lines. Con 'auto':
+    pyarrow para JSON Lines de hasta LIMITE_PYARROW_MB, orjson para arreglos
+    JSON de hasta LIMITE_ORJSON_MB y para JSON Lines más grandes (línea a
+    línea), y el parser estándar (por bloques) en el resto.
+    """
+    if parser not in PARSERS_JSON:
+        raise ValueError(f"Parser JSON desconocido: {parser}")
+    if parser == 'pyarrow' and (pa_json is None or formato != 'jsonl'):
+        raise ValueError("El parser pyarrow requiere pyarrow y solo lee JSON Lines")
+    if parser == 'orjson' and orjson is None:
+        raise ValueError("El parser orjson requiere el paquete orjson")
+    if parser != 'auto':
+        return parser
+
+    if formato == 'jsonl':
+        if pa_json is not None and tamano is not None and tamano <= LIMITE_PYARROW_MB * 1024 ** 2:
+            return 'pyarrow'
+        return 'orjson' if orjson is not None else 'stdlib'
+    if orjson is not None and tamano is not None and tamano <= LIMITE_ORJSON_MB * 1024 ** 2:
+        return 'orjson'
+    return 'stdlib'
+
+def _tamano_origen(origen):
+    """
+    Tamaño en bytes de una ruta o de un archivo binario en memoria (o None)
+    """
+    if isinstance(origen, str):
+        return os.path.getsize(origen)
+    if isinstance(origen, io.BytesIO):
+        return origen.getbuffer().nbytes - origen.tell()
+    return None
+
+def _tipar_bloque(df):
+    """
+    Aplica los tipos explícitos a las columnas conocidas del bloque
+    """
+    faltantes = [col for col in COLUMNAS if col not in df.columns]
+    if faltantes:
+        raise ValueError(f"Faltan columnas requeridas: {', '.join(faltantes)}")
+
+    tipos = {col: tipo for col, tipo in TIPOS_COLUMNAS.items() if df[col].dtype != tipo}
+    enteros = {col: _a_enteros(df[col].to_numpy(), col) for col, tipo in tipos.items() if tipo == 'int64'}
+    tipos = {col: tipo for col, tipo in tipos.items() if col not in enteros}
+    if enteros:
+        df = df.assign(**enteros)
+    return df.astype(tipos) if tipos else df
+
+def iterar_bloques(origen, formato, filas_por_bloque=FILAS_POR_BLOQUE, parser=PARSER_JSON):
+    """
+    Genera DataFrames tipados de como máximo `filas_por_bloque` filas.
+    `origen` puede ser una ruta o un archivo ya abierto. `parser` elige cómo
+    se decodifica el JSON (ver elegir_parser).
+    """
+    if formato == 'csv':
+        lector = pd.read_csv(origen, dtype=TIPOS_COLUMNAS, chunksize=filas_por_bloque)
+        with lector:
+            for bloque in lector:
+                yield _tipar_bloque(bloque)
+        return
+
+    # Un archivo de texto ya abierto solo lo puede leer el parser estándar
+    if parser == 'auto' and isinstance(origen, io.TextIOBase):
+        parser = 'stdlib'
+    parser = elegir_parser(formato, parser, _tamano_origen(origen))
+
+    if parser == 'pyarrow':
+        for bloque in _bloques_pyarrow(origen, filas_por_bloque):
+            yield _tipar_bloque(bloque)
+        return
+
+    # orjson trabaja sobre bytes; el parser estándar sobre texto
+    if parser == 'orjson':
+        iterador = _iterar_json_array_orjson if formato == 'json' else _iterar_json_lines_orjson
+    else:
+        iterador = _iterar_json_array if formato == 'json' else _iterar_json_lines
+
+    if isinstance(origen, str):
+        f = open(origen, 'rb') if parser == 'orjson' else open(origen, 'r', encoding='utf-8')
+    elif parser == 'orjson':
+        f = origen.buffer if isinstance(origen, io.TextIOWrapper) else origen
+    elif isinstance(origen, io.TextIOBase):
+        f = origen
+    else:
+        f = io.TextIOWrapper(origen, encoding='utf-8')
+
+    try:
+        for registros in iterador(f, filas_por_bloque):
+            yield _columnas_de_registros(registros)
+    finally:
+        if isinstance(origen, str):
+            f.close()
+
+def memoria_mb(df):
+    """
+    Memoria ocupada por un DataFrame en MB (incluye el contenido de los textos)
+    """
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+def unificar_categorias(bloques):
+    """
+    Da a cada columna categórica las mismas categorías en todos los bloques,
+    para que pd.concat conserve el tipo 'category' en lugar de volver a object.
+    Devuelve bloques nuevos: los originales no se modifican (con Copy-on-Write
+    comparten los datos de las demás columnas sin copiarlos).
+    """
+    if len(bloques) < 2:
+        return bloques
+
+    columnas = [col for col, tipo in bloques[0].dtypes.items()
+                if isinstance(tipo, pd.CategoricalDtype)]
+    categorias = {
+        col: union_categoricals([bloque[col] for bloque in bloques], sort_categories=True).categories
+        for col in columnas
+    }
+
+    return [
+        bloque.assign(**{col: bloque[col].cat.set_categories(cats) for col, cats in categorias.items()})
+        for bloque in bloques
+    ]
+
+def _firmas(archivo, *offsets):
+    """
+    Hash de los bytes anteriores a cada offset (en una sola pasada)
+    """
+    firma = hashlib.sha1()
+    firmas = []
+    leidos = 0
+    with open(archivo, 'rb') as f:
+        for offset in offsets:
+            while leidos < offset:
+                datos = f.read(min(TAMANO_LECTURA, offset - leidos))
+                if not datos:
+                    break
+                firma.update(datos)
+                leidos += len(datos)
+            firmas.append(firma.hexdigest())
+    return firmas
+
+def _fin_arreglo(archivo):
+    """
+    Posición tras el último elemento de un arreglo JSON (lo que precede al
+    ']' final, sin espacios), o None si el archivo no termina en ']'
+    """
+    with open(archivo, 'rb') as f:
+        inicio = max(0, f.seek(0, os.SEEK_END) - TAMANO_LECTURA)
+        f.seek(inicio)
+        cola = f.read().rstrip()
+    if not cola.endswith(b']'):
+        return None
+
+    contenido = cola[:-1].rstrip()
+    if not contenido and inicio > 0:
+        return None
+    return inicio + len(contenido)
+
+def estado_lectura(archivo, formato, offset=None):
+    """
+    Posición hasta la que se ha leído un archivo y firma de los bytes
+    previos, para poder leer después solo lo añadido. En un arreglo JSON la
+    posición es la del último elemento: lo nuevo se añade tras ella.
+    """
+    if offset is None:
+        offset = _fin_arreglo(archivo) if formato == 'json' else os.path.getsize(archivo)
+        if offset is None:
+            return {'formato': formato}
+    return {'formato': formato, 'offset': offset, 'firma': _firmas(archivo, offset)[0]}
+
+def _incremento_arreglo(archivo, estado, filas_por_bloque):
+    """
+    Compras añadidas a un arreglo JSON: los bytes hasta el último elemento
+    de la lectura previa deben seguir idénticos y lo nuevo debe ser una
+    lista de objetos separada por comas antes del nuevo ']' final
+    """
+    offset = estado['offset']
+    fin = _fin_arreglo(archivo)
+    if fin is None or fin < offset:
+        return None
+    firma, firma_nueva = _firmas(archivo, offset, fin)
+    if firma != estado.get('firma'):
+        return None
+
+    with open(archivo, 'rb') as f:
+        f.seek(offset)
+        nuevos = f.read(fin - offset).strip()
+    nuevo_estado = {'formato': 'json', 'offset': fin, 'firma': firma_nueva}
+
+    if not nuevos:
+        return [], nuevo_estado
+
+    # Tras compras ya leídas lo añadido empieza por una coma
+    previas = estado.get('filas', 1) > 0
+    if nuevos.startswith(b',') != previas:
+        return None
+
+    try:
+        origen = io.BytesIO(b'[' + (nuevos[1:] if previas else nuevos) + b']')
+        return list(iterar_bloques(origen, 'json', filas_por_bloque)), nuevo_estado
+    except ValueError:
+        return None
+
+def leer_incremento(archivo, estado, filas_por_bloque=FILAS_POR_BLOQUE):
+    """
+    Lee solo las compras añadidas al archivo desde la lectura descrita por
+    `estado` (ver leer_por_bloques). JSON Lines y CSV se leen a partir del
+    offset en bytes; en un arreglo JSON, lo añadido antes del ']' final.
+    Devuelve (bloques, nuevo_estado), o None si el archivo no creció solo
+    por el final y hay que recargarlo completo.
+    """
+    formato = estado.get('formato')
+    offset = estado.get('offset')
+    if formato is None or offset is None:
+        return None
+
+    if formato == 'json':
+        return _incremento_arreglo(archivo, estado, filas_por_bloque)
+
+    # JSON Lines / CSV: la parte ya leída no debe haber cambiado
+    tamano = os.path.getsize(archivo)
+    if tamano < offset:
+        return None
+
+    with open(archivo, 'rb') as f:
+        if offset > 0:
+            f.seek(offset - 1)
+            if f.read(1) != b'\n':
+                return None
+        nuevos = f.read(tamano - offset)
+
+    # Solo líneas completas; una línea a medio escribir se leerá la próxima vez
+    fin = nuevos.rfind(b'\n') + 1
+    nuevos = nuevos[:fin]
+    firma, firma_nueva = _firmas(archivo, offset, offset + fin)
+    if firma != estado.get('firma'):
+        return None
+    nuevo_estado = {'formato': formato, 'offset': offset + fin, 'firma': firma_nueva}
+
+    if not nuevos.strip():
+        return [], nuevo_estado
+
+    if formato == 'csv':
+        with open(archivo, 'rb') as f:
+            cabecera = f.readline()
+        origen = io.BytesIO(cabecera + nuevos)
+        return list(iterar_bloques(origen, 'csv', filas_por_bloque)), nuevo_estado
+
+    return list(iterar_bloques(io.BytesIO(nuevos), 'jsonl', filas_por_bloque)), nuevo_estado
+
+def fusionar_ordenados(df, nuevas):
+    """
+    Une dos DataFrames ya ordenados por fecha en uno ordenado, en tiempo
+    lineal (sin reordenar todo): las filas nuevas se intercalan detrás de
+    las existentes con la misma fecha
+    """
+    bloques = unificar_categorias([df, nuevas])
+    combinado = pd.concat(bloques)
+
+    fechas = df['fecha'].to_numpy()
+    fechas_nuevas = nuevas['fecha'].to_numpy()
+    if len(fechas) == 0 or len(fechas_nuevas) == 0 or fechas_nuevas[0] >= fechas[-1]:
+        return combinado
+
+    n, m = len(fechas), len(fechas_nuevas)
+    destino = np.searchsorted(fechas, fechas_nuevas, side='right') + np.arange(m)
+    es_nueva = np.zeros(n + m, dtype=bool)
+    es_nueva[destino] = True
+
+    orden = np.empty(n + m, dtype=np.int64)
+    orden[es_nueva] = n + np.arange(m)
+    orden[~es_nueva] = np.arange(n)
+
+    return combinado.take(orden)
+
+def leer_por_bloques(origen, formato, procesar, filas_por_bloque=FILAS_POR_BLOQUE,
+                     memoria_maxima_mb=MEMORIA_MAXIMA_MB, parser=PARSER_JSON):
+    """
+    Lee el archivo por bloques, aplica `procesar` a cada bloque y concatena
+    el resultado ordenado por fecha. La memoria estimada de los bloques
+    acumulados (y de la concatenación final) no puede superar
+    `memoria_maxima_mb`; el pico se guarda en `df.attrs['ingesta']`. Con el
+    parser pyarrow también cuenta la memoria que ocupa la tabla Arrow.
+    """
+    bloques = []
+    filas = 0
+    memoria_acumulada = 0.0
+    pico = 0.0
+    arrow_inicial = pa.total_allocated_bytes() if pa is not None else 0
+
+    # Estado para lecturas incrementales posteriores (solo rutas en disco)
+    estado = estado_lectura(origen, formato) if isinstance(origen, str) else {}
+
+    for bloque in iterar_bloques(origen, formato, filas_por_bloque, parser):
+        # Índice global único para que idxmax/loc sigan funcionando
+        bloque.index = pd.RangeIndex(filas, filas + len(bloque))
+        filas += len(bloque)
+
+        bloque = procesar(bloque)
+        memoria_acumulada += memoria_mb(bloque)
+        memoria_arrow = (pa.total_allocated_bytes() - arrow_inicial) / 1024 ** 2 if pa is not None else 0.0
+        pico = max(pico, memoria_acumulada + max(memoria_arrow, 0.0))
+
+        if memoria_maxima_mb is not None and pico > memoria_maxima_mb:
+            raise MemoryError(
+                f"La carga supera el presupuesto de memoria "
+                f"({pico:,.1f} MB > {memoria_maxima_mb:,.1f} MB)"
+            )
+
+        bloques.append(bloque)
+
+    if not bloques:
+        return pd.DataFrame(columns=COLUMNAS)
+
+    # La concatenación mantiene los bloques y el resultado a la vez
+    pico = max(pico, 2 * memoria_acumulada) if len(bloques) > 1 else pico
+    if memoria_maxima_mb is not None and pico > memoria_maxima_mb:
+        raise MemoryError(
+            f"La concatenación supera el presupuesto de memoria "
+            f"({pico:,.1f} MB > {memoria_maxima_mb:,.1f} MB)"
+        )
+
+    df = pd.concat(unificar_categorias(bloques)) if len(bloques) > 1 else bloques[0]
+    del bloques
+
+    # Cada bloque viene ordenado; solo se reordena si hay solapamiento
+    if not df['fecha'].is_monotonic_increasing:
+        df = df.sort_values('fecha', kind='stable')
+
+    df.attrs['ingesta'] = {
+        'filas': filas,
+        'bloques': -(-filas // filas_por_bloque),
+        'memoria_mb': round(memoria_acumulada, 2),
+        'memoria_pico_mb': round(pico, 2),
+        **estado
+    }
+
+    return df
+
+def es_multiple(origen):
+    """
+    Indica si `origen` es un directorio o un patrón glob de varios fragmentos
+    """
+    return isinstance(origen, str) and (os.path.isdir(origen) or any(c in origen for c in '*?['))
+
+def listar_fragmentos(origen):
+    """
+    Archivos de compras (JSON, JSON Lines o CSV) de un directorio o patrón glob
+    """
+    if os.path.isdir(origen):
+        rutas = [os.path.join(origen, nombre) for nombre in os.listdir(origen)]
+    else:
+        rutas = glob.glob(origen)
+
+    return sorted(ruta for ruta in rutas if ruta.lower().endswith(EXTENSIONES) and os.path.isfile(ruta))
+
+def rango_fragmento(ruta):
+    """
+    Rango de fechas (desde, hasta) que cubre un fragmento según la fecha de
+    su nombre (un mes o un día), o None si el nombre no la indica
+    """
+    coincidencia = PATRON_FECHA_FRAGMENTO.search(os.path.basename(ruta))
+    if coincidencia is None:
+        return None
+
+    año, mes, dia = coincidencia.groups()
+    año, mes = int(año), int(mes)
+    if not 1 <= mes <= 12:
+        return None
+    if dia is not None:
+        desde = pd.Timestamp(año, mes, int(dia))
+        return desde, desde
+    return pd.Timestamp(año, mes, 1), pd.Timestamp(año, mes, calendar.monthrange(año, mes)[1])
+
+def limites_fragmentos(rutas):
+    """
+    Primera y última fecha que cubren los fragmentos según sus nombres, o
+    None si alguno no indica fecha
+    """
+    rangos = [rango_fragmento(ruta) for ruta in rutas]
+    if not rangos or any(rango is None for rango in rangos):
+        return None
+    return min(rango[0] for rango in rangos), max(rango[1] for rango in rangos)
+
+def filtrar_fragmentos(rutas, rango_fechas):
+    """
+    Descarta los fragmentos cuyo rango de fechas no corta `rango_fechas`
+    (los que no indican fecha en el nombre se conservan siempre)
+    """
+    if not rango_fechas or len(rango_fechas) != 2:
+        return list(rutas)
+
+    desde, hasta = pd.Timestamp(rango_fechas[0]), pd.Timestamp(rango_fechas[1])
+    seleccion = []
+    for ruta in rutas:
+        rango = rango_fragmento(ruta)
+        if rango is None or (rango[0] <= hasta and rango[1] >= desde):
+            seleccion.append(ruta)
+    return seleccion
+
+def _leer_fragmento(ruta, procesar, filas_por_bloque, parser):
+    """
+    Lee y procesa un fragmento completo (se ejecuta en un proceso del pool)
+    """
+    return leer_por_bloques(ruta, detectar_formato(ruta), procesar, filas_por_bloque,
+                            memoria_maxima_mb=None, parser=parser)
+
+def fusionar_k(partes):
+    """
+    Une k DataFrames ordenados por fecha fusionándolos por pares en un
+    árbol: log2(k) pasadas lineales en lugar de reordenar todas las filas
+    """
+    partes = [parte for parte in partes if len(parte)]
+    if not partes:
+        return None
+
+    while len(partes) > 1:
+        fusionadas = [fusionar_ordenados(partes[i], partes[i + 1]) for i in range(0, len(partes) - 1, 2)]
+        if len(partes) % 2:
+            fusionadas.append(partes[-1])
+        partes = fusionadas
+
+    return partes[0]
+
+def leer_fragmentos(rutas, procesar, procesos=None, filas_por_bloque=FILAS_POR_BLOQUE,
+                    memoria_maxima_mb=MEMORIA_MAXIMA_MB, parser=PARSER_JSON):
+    """
+    Lee y procesa varios fragmentos en paralelo en un pool de procesos
+    (`procesar` debe poder enviarse a otro proceso, p. ej. una función de
+    módulo o un partial) y los fusiona en un único DataFrame ordenado.
+    """
+    if not rutas:
+        return pd.DataFrame(columns=COLUMNAS)
+
+    procesos = min(procesos or os.cpu_count() or 1, len(rutas))
+    argumentos = (procesar, filas_por_bloque, parser)
+    if procesos == 1:
+        partes = [_leer_fragmento(ruta, *argumentos) for ruta in rutas]
+    else:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            partes = list(pool.map(_leer_fragmento, rutas, *[[arg] * len(rutas) for arg in argumentos]))
+
+    # Índices globales únicos: cada fragmento se desplaza tras los anteriores
+    filas = 0
+    for parte in partes:
+        parte.index = parte.index + filas
+        filas += len(parte)
+
+    memoria = sum(memoria_mb(parte) for parte in partes)
+    pico = 2 * memoria if len(partes) > 1 else memoria
+    if memoria_maxima_mb is not None and pico > memoria_maxima_mb:
+        raise MemoryError(
+            f"Los fragmentos superan el presupuesto de memoria "
+            f"({pico:,.1f} MB > {memoria_maxima_mb:,.1f} MB)"
+        )
+
+    df = fusionar_k(partes)
+    if df is None:
+        return pd.DataFrame(columns=COLUMNAS)
+    del partes
+
+    df.attrs['ingesta'] = {
+        'filas': filas,
+        'fragmentos': len(rutas),
+        'procesos': procesos,
+        'memoria_mb': round(memoria, 2),
+        'memoria_pico_mb': round(pico, 2)
+    }
+
+    return df
@@ -0,0 +1,68 @@
+"""
+Pruebas de la carga, las columnas derivadas y los filtros (data_loader.py)
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from benchmark import escribir_compras, fechas_sinteticas, generar_compras, partes_fecha_strftime
+from data_loader import (aplicar_filtros, aplicar_filtros_con_cache, cargar_datos, derivar_partes_fecha,
+                         estado_filtros, memorizar_agregado, procesar_datos, rollup_filtrado)
+
+
+def test_partes_fecha_como_strftime():
+    fechas = fechas_sinteticas(5_000)
+    referencia = partes_fecha_strftime(fechas)
+
+    for columna, valores in derivar_partes_fecha(fechas).items():
+        np.testing.assert_array_equal(np.asarray(valores), referencia[columna].to_numpy(), err_msg=columna)
+
+
+@pytest.mark.parametrize('formato', ['json', 'jsonl', 'csv'])
+def test_carga_incremental_como_completa(tmp_path, monkeypatch, formato):
+    # La caché en disco (ruta relativa) queda dentro del directorio temporal
+    monkeypatch.chdir(tmp_path)
+
+    crudo = generar_compras(2_000)
+    crudo = crudo.iloc[np.argsort(crudo['fecha'].to_numpy(), kind='stable')].reset_index(drop=True)
+    # Compras añadidas el mismo día que la última del archivo
+    añadidas = generar_compras(50, semilla=1).assign(fecha=crudo['fecha'].iloc[-1])
+    ampliado = pd.concat([crudo, añadidas], ignore_index=True)
+    modificado = ampliado.copy()
+    modificado.loc[0, 'precio'] = modificado.loc[0, 'precio'] + 1000
+
+    ruta = escribir_compras(crudo, f"compras.{formato}")
+    cargar_datos(ruta, memoria_maxima_mb=None)
+
+    for compras in (ampliado, modificado):
+        escribir_compras(compras, ruta)
+        incremental = cargar_datos(ruta, memoria_maxima_mb=None)
+        completa = cargar_datos(ruta, usar_cache=False, memoria_maxima_mb=None)
+        pd.testing.assert_frame_equal(incremental, completa)
+
+
+@pytest.fixture
+def compras(request):
+    df = procesar_datos(generar_compras(1_000, plataformas=3, categorias=3))
+    # Una huella por prueba: las estructuras derivadas se guardan por huella
+    df.attrs['huella'] = request.node.name
+    return df
+
+
+def test_valor_ausente_no_coincide_con_nulos(compras):
+    compras.loc[compras.index[:5], 'plataforma'] = np.nan
+
+    assert len(aplicar_filtros(compras, 'No existe', 'Todas', ())) == 0
+    assert len(aplicar_filtros(compras, 'Plataforma 1', 'No existe', ())) == 0
+
+
+def test_sub_seleccion_sin_estado_de_filtros(compras):
+    filtrado = aplicar_filtros_con_cache(compras, 'Todas', 'Todas', ())
+    seleccion = filtrado[filtrado['cantidad'] > 1]
+
+    assert estado_filtros(filtrado) is not None
+    assert estado_filtros(seleccion) is None
+    assert rollup_filtrado(seleccion) is None
+
+    contar = lambda df: len(df)
+    assert memorizar_agregado(filtrado.iloc[:5], 'prueba', contar) == 5
+    assert memorizar_agregado(filtrado.iloc[5:8], 'prueba', contar) == 3
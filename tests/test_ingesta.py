@@ -0,0 +1,50 @@
+"""
+Pruebas de la lectura de archivos de compras (ingesta.py)
+"""
+import pandas as pd
+import pytest
+import ingesta
+from benchmark import bloques_registros, escribir_compras, generar_compras
+
+
+def parsers_disponibles(formato):
+    """
+    Parsers JSON que se pueden usar con el formato en este entorno
+    """
+    disponibles = []
+    for parser in ingesta.PARSERS_JSON[1:]:
+        try:
+            ingesta.elegir_parser(formato, parser)
+        except ValueError:
+            continue
+        disponibles.append(parser)
+    return disponibles
+
+
+@pytest.mark.parametrize('formato', ['json', 'jsonl'])
+def test_parsers_equivalentes(tmp_path, formato):
+    ruta = escribir_compras(generar_compras(2_000), str(tmp_path / f"compras.{formato}"))
+    referencia = pd.concat(bloques_registros(ruta, formato, filas_por_bloque=500), ignore_index=True)
+
+    for parser in parsers_disponibles(formato):
+        leido = pd.concat(ingesta.iterar_bloques(ruta, formato, filas_por_bloque=500, parser=parser),
+                          ignore_index=True)
+        pd.testing.assert_frame_equal(leido, referencia, obj=parser)
+
+
+@pytest.mark.parametrize('formato', ['json', 'jsonl', 'csv'])
+def test_cantidad_no_entera_rechazada(tmp_path, formato):
+    compras = generar_compras(10).astype({'cantidad': 'float64'})
+    compras.loc[3, 'cantidad'] = 1.5
+    ruta = escribir_compras(compras, str(tmp_path / f"no_enteras.{formato}"))
+
+    parsers = parsers_disponibles(formato) if formato != 'csv' else [ingesta.PARSER_JSON]
+    for parser in parsers:
+        with pytest.raises(ValueError):
+            list(ingesta.iterar_bloques(ruta, formato, parser=parser))
+
+
+def test_auto_no_usa_pyarrow_en_jsonl_grandes():
+    limite = ingesta.LIMITE_PYARROW_MB * 1024 ** 2
+    assert ingesta.elegir_parser('jsonl', 'auto', limite + 1) != 'pyarrow'
+    assert ingesta.elegir_parser('jsonl', 'auto') != 'pyarrow'